@@ -0,0 +1,106 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Flush the write buffer once it holds this many entries...
+FLUSH_BATCH_SIZE = 256
+# ...or once the oldest buffered entry is this many seconds old
+FLUSH_INTERVAL = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS activity (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    type TEXT NOT NULL,
+    message TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS activity_type_id ON activity (type, id);
+"""
+
+
+# Append-only activity log stored in SQLite (WAL mode). Writes go to an in-memory
+# deque and are flushed in batches; reads flush first so they always see every
+# entry. Queries page backwards from the newest entry using the row id as cursor.
+class ActivityLog:
+    def __init__(self, path, batch_size=FLUSH_BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.version = 0
+        self._buffer = deque()
+        self._oldest_buffered = None
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        atexit.register(self.close)
+
+    def append(self, message, entry_type="info", timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._buffer.append((timestamp, entry_type, message))
+            self.version += 1
+            if self._oldest_buffered is None:
+                self._oldest_buffered = timestamp
+            due = len(self._buffer) >= self.batch_size or timestamp - self._oldest_buffered >= self.flush_interval
+        if due:
+            self.flush()
+
+    # Write all buffered entries in a single transaction
+    def flush(self):
+        with self._lock:
+            if not self._buffer:
+                return
+            rows = []
+            while self._buffer:
+                rows.append(self._buffer.popleft())
+            self._oldest_buffered = None
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT INTO activity (ts, type, message) VALUES (?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+
+    # Newest-first page of entries, optionally filtered by type. Pass the returned
+    # cursor as `before` to fetch the next (older) page; it is None when there are
+    # no more entries. Entries from before today show their date as well as the time.
+    def query(self, entry_type=None, limit=50, before=None):
+        self.flush()
+        clauses, params = [], []
+        if entry_type is not None:
+            clauses.append("type = ?")
+            params.append(entry_type)
+        if before is not None:
+            clauses.append("id < ?")
+            params.append(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, ts, type, message FROM activity {where} ORDER BY id DESC LIMIT ?", params
+            ).fetchall()
+
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+        entries = [{
+            "id": row_id,
+            "timestamp": ts,
+            "time": datetime.fromtimestamp(ts).strftime("%H:%M:%S" if ts >= today else "%Y-%m-%d %H:%M:%S"),
+            "type": entry_type,
+            "message": message
+        } for row_id, ts, entry_type, message in rows]
+        next_cursor = rows[-1][0] if len(rows) == limit else None
+        return entries, next_cursor
+
+    def close(self):
+        if self._db is None:
+            return
+        self.flush()
+        with self._lock:
+            self._db.close()
+            self._db = None
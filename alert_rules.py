@@ -0,0 +1,156 @@
+import threading
+import time
+
+import numpy as np
+
+from entity_columns import EntityColumns, grow
+
+# Comparison operators a rule or guard can use
+OPERATORS = {
+    '>': np.greater,
+    '>=': np.greater_equal,
+    '<': np.less,
+    '<=': np.less_equal,
+}
+
+
+# Declarative alert rule: raise `message` for an entity when `channel <op> threshold`.
+# Once raised, the (rule, entity) pair stays active - and is not raised again - until
+# the value no longer satisfies `<op> clear_threshold` (hysteresis). A rule that has
+# fired is not raised again for the same entity within `cooldown` seconds. `when` is an
+# optional (context_key, op, value) guard, e.g. ('armed', '>', 0) for door alerts.
+class Rule:
+    __slots__ = ('name', 'channel', 'op', 'threshold', 'clear_threshold', 'cooldown', 'message', 'when')
+
+    def __init__(self, name, channel, op, threshold, message, clear_threshold=None, cooldown=0.0, when=None):
+        if op not in OPERATORS or (when is not None and when[1] not in OPERATORS):
+            raise ValueError(f"Unsupported operator in rule {name!r}")
+        self.name = name
+        self.channel = channel
+        self.op = op
+        self.threshold = threshold
+        self.clear_threshold = threshold if clear_threshold is None else clear_threshold
+        self.cooldown = cooldown
+        self.message = message
+        self.when = when
+
+    # Alert text for an entity; `message` may use {entity} and {value}
+    def format(self, entity, value):
+        return self.message.format(entity=entity, value=value)
+
+
+# The rules on the current home, matching the checks app.py used to hard-code
+DEFAULT_RULES = (
+    Rule('high_temperature', 'temperature', '>', 26, "Temperature above normal: {value:g}°C",
+         clear_threshold=25.5, cooldown=600),
+    Rule('thermostat_high', 'thermostat', '>', 28, "Thermostat set very high: {value:g}°C",
+         cooldown=600),
+    Rule('door_open_armed', 'door_open', '>', 0.5, "Security alert: {entity} door opened while system armed!",
+         when=('armed', '>', 0.5)),
+)
+
+
+# Alerts raised by one evaluate() call: parallel arrays of rule rows, entity indexes
+# and the values that triggered them. Iterating yields (rule, entity, message).
+class Firings:
+    __slots__ = ('group', 'rule_rows', 'entity_rows', 'values')
+
+    def __init__(self, group, rule_rows, entity_rows, values):
+        self.group = group
+        self.rule_rows = rule_rows
+        self.entity_rows = entity_rows
+        self.values = values
+
+    def __len__(self):
+        return len(self.rule_rows)
+
+    def __iter__(self):
+        if not len(self):
+            return
+        rules, entities = self.group.rules, self.group.entities
+        for row, entity_row, value in zip(self.rule_rows.tolist(), self.entity_rows.tolist(), self.values.tolist()):
+            rule = rules[row]
+            entity = entities.entity(entity_row)
+            yield rule, entity, rule.format(entity, value)
+
+
+# All rules on one channel, compiled into threshold columns grouped by operator,
+# with per-(rule, entity) state held in (n_rules, n_entities) arrays
+class _RuleGroup:
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.by_op = []
+        for op in OPERATORS:
+            rows = np.array([i for i, rule in enumerate(self.rules) if rule.op == op], dtype=np.intp)
+            if len(rows):
+                thresholds = np.array([[self.rules[i].threshold] for i in rows], dtype=np.float64)
+                clears = np.array([[self.rules[i].clear_threshold] for i in rows], dtype=np.float64)
+                self.by_op.append((OPERATORS[op], rows, thresholds, clears))
+        self.cooldowns = np.array([[rule.cooldown] for rule in self.rules], dtype=np.float64)
+        self.guarded = [(i, rule.when) for i, rule in enumerate(self.rules) if rule.when is not None]
+        self.entities = EntityColumns()
+        self.active = np.zeros((len(self.rules), 0), dtype=bool)
+        self.last_fired = np.zeros((len(self.rules), 0), dtype=np.float64)
+
+    # Columns of the state arrays for a batch of entities, growing them as needed
+    def columns(self, entities, count):
+        columns, size = self.entities.columns(entities, count)
+        if size is not None:
+            self.active = grow(self.active, size)
+            self.last_fired = grow(self.last_fired, size, -np.inf)
+        return columns
+
+
+# Evaluates compiled rules against batches of readings. Each channel's rules are
+# checked for all given entities with a handful of array operations, and dedup,
+# hysteresis and cooldown are tracked per (rule, entity) without scanning alerts.
+class RuleEngine:
+    def __init__(self, rules=DEFAULT_RULES):
+        by_channel = {}
+        for rule in rules:
+            by_channel.setdefault(rule.channel, []).append(rule)
+        self._groups = {channel: _RuleGroup(group) for channel, group in by_channel.items()}
+        self._lock = threading.Lock()
+
+    # Check `values` for one channel. `entities` names the entity of each value; when
+    # omitted, value i belongs to integer entity i (e.g. a home index in a fleet).
+    # `context` supplies guard inputs as scalars or arrays aligned with `values`.
+    def evaluate(self, channel, values, entities=None, context=None, now=None):
+        group = self._groups.get(channel)
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        if group is None or not len(values):
+            empty = np.empty(0, dtype=np.intp)
+            return Firings(group, empty, empty, np.empty(0))
+        now = time.time() if now is None else now
+        with self._lock:
+            return self._evaluate(group, values, entities, context, now)
+
+    def _evaluate(self, group, values, entities, context, now):
+        columns = group.columns(entities, len(values))
+        triggered = np.zeros((len(group.rules), len(values)), dtype=bool)
+        holding = np.zeros_like(triggered)
+        for compare, rows, thresholds, clears in group.by_op:
+            triggered[rows] = compare(values, thresholds)
+            holding[rows] = compare(values, clears)
+        for row, (key, op, value) in group.guarded:
+            triggered[row] &= OPERATORS[op](np.asarray(context[key], dtype=np.float64), value)
+
+        # Active pairs stay active while the value holds past the clear threshold
+        active = group.active[:, columns] & holding
+        cooled = now - group.last_fired[:, columns] >= group.cooldowns
+        fired = triggered & ~active & cooled
+        active |= fired
+        group.active[:, columns] = active
+
+        rule_rows, value_rows = np.nonzero(fired)
+        entity_rows = value_rows if entities is None else columns[value_rows]
+        group.last_fired[rule_rows, entity_rows] = now
+        return Firings(group, rule_rows, entity_rows, values[value_rows])
+
+    # Forget active alerts and their cooldowns, so a condition that still holds is
+    # raised again
+    def reset(self):
+        with self._lock:
+            for group in self._groups.values():
+                group.active[:] = False
+                group.last_fired[:] = -np.inf
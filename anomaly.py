@@ -0,0 +1,253 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from entity_columns import EntityColumns, grow
+
+# Quantiles tracked per entity; a value is only anomalous outside this band
+QUANTILES = (0.05, 0.95)
+# How fast the quantile estimates move, relative to how fast the recent mean does
+QUANTILE_RATE = 4.0
+
+
+# Detection settings of one sensor channel. A value is anomalous when it lies outside
+# the entity's tracked quantile band and more than `threshold` recent standard
+# deviations from its recent mean; it is reported again only after dropping back
+# below `clear_threshold` deviations and `cooldown` seconds have passed.
+#
+# `half_life` (in samples) sets how fast the recent mean and deviation follow the
+# signal, `min_std` keeps a flat signal from turning every wobble into an anomaly,
+# and nothing is reported for the first `warmup` samples of an entity. With
+# `smoothing` set, raw values are first averaged over roughly that many samples,
+# turning e.g. 0/1 motion readings into a motion rate. `message` may use {entity},
+# {value} and {expected}.
+class Channel:
+    __slots__ = ('name', 'message', 'threshold', 'clear_threshold', 'half_life', 'min_std', 'warmup',
+                 'cooldown', 'smoothing')
+
+    def __init__(self, name, message, threshold=4.0, clear_threshold=2.0, half_life=300, min_std=0.1,
+                 warmup=60, cooldown=600.0, smoothing=None):
+        self.name = name
+        self.message = message
+        self.threshold = threshold
+        self.clear_threshold = clear_threshold
+        self.half_life = half_life
+        self.min_std = min_std
+        self.warmup = warmup
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+
+    def format(self, entity, value, expected):
+        return self.message.format(entity=entity, value=value, expected=expected)
+
+
+# The channels app.py feeds from update_sensors()
+DEFAULT_CHANNELS = (
+    Channel('temperature', "Unusual temperature: {value:.1f}°C (recently about {expected:.1f}°C)",
+            min_std=0.2),
+    Channel('humidity', "Unusual humidity: {value:.0f}% (recently about {expected:.0f}%)",
+            min_std=1.0),
+    Channel('motion_rate', "Unusual motion: {value:.0%} of readings (recently about {expected:.0%})",
+            min_std=0.02, smoothing=30),
+    Channel('power', "Unusual power draw: {value:.2f} kW (recently about {expected:.2f} kW)",
+            min_std=0.05),
+)
+
+
+# Anomalies found by one update() call: parallel arrays of entity indexes, values and
+# the expected values they were compared with. Iterating yields (entity, message).
+class Anomalies:
+    __slots__ = ('stats', 'entity_rows', 'values', 'expected')
+
+    def __init__(self, stats, entity_rows, values, expected):
+        self.stats = stats
+        self.entity_rows = entity_rows
+        self.values = values
+        self.expected = expected
+
+    def __len__(self):
+        return len(self.entity_rows)
+
+    def __iter__(self):
+        if not len(self):
+            return
+        channel, entities = self.stats.channel, self.stats.entities
+        for row, value, expected in zip(self.entity_rows.tolist(), self.values.tolist(), self.expected.tolist()):
+            entity = entities.entity(row)
+            yield entity, channel.format(entity, value, expected)
+
+
+# Running statistics of one channel for every entity, one array element per entity:
+# Welford's mean and variance over all samples, an exponentially weighted mean and
+# variance over recent samples, and a stochastic-approximation sketch of each of
+# QUANTILES. Each sample updates every statistic in place, so memory and time per
+# sample are constant and no history is kept.
+class _ChannelStats:
+    _ARRAYS = ('count', 'mean', 'm2', 'ewma', 'ewvar', 'smoothed', 'active', 'last_fired')
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.alpha = 1 - 0.5 ** (1 / channel.half_life)
+        self.smoothing_alpha = None if channel.smoothing is None else 1 / channel.smoothing
+        self.quantile_levels = np.array(QUANTILES)[:, None]
+        self.entities = EntityColumns()
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.m2 = np.zeros(0)
+        self.ewma = np.zeros(0)
+        self.ewvar = np.zeros(0)
+        self.smoothed = np.zeros(0)
+        self.quantiles = np.zeros((len(QUANTILES), 0))
+        self.active = np.zeros(0, dtype=bool)
+        self.last_fired = np.zeros(0)
+
+    # Columns of the state arrays for a batch of entities, growing them as needed
+    def columns(self, entities, count):
+        columns, size = self.entities.columns(entities, count)
+        if size is not None:
+            for name in self._ARRAYS:
+                setattr(self, name, grow(getattr(self, name), size, -np.inf if name == 'last_fired' else 0))
+            self.quantiles = grow(self.quantiles, size)
+        return columns
+
+    def update(self, values, columns, now):
+        channel = self.channel
+        count = self.count[columns]
+        first = count == 0
+        if self.smoothing_alpha is not None:
+            smoothed = self.smoothed[columns]
+            values = np.where(first, values, smoothed + self.smoothing_alpha * (values - smoothed))
+            self.smoothed[columns] = values
+
+        # Score against the statistics from before this sample. A slice of columns
+        # gives a view, so the mean is copied to still report it after the update.
+        ewma = self.ewma[columns].copy()
+        ewvar = self.ewvar[columns]
+        quantiles = self.quantiles[:, columns]
+        scale = np.maximum(np.sqrt(ewvar), channel.min_std)
+        deviation = np.abs(values - ewma) / scale
+        warm = count >= channel.warmup
+        outside = (values < quantiles[0]) | (values > quantiles[-1])
+        # Active entities stay active while the value stays away from the recent mean
+        active = self.active[columns] & warm & (deviation > channel.clear_threshold)
+        cooled = now - self.last_fired[columns] >= channel.cooldown
+        fired = warm & outside & (deviation > channel.threshold) & ~active & cooled
+        active |= fired
+        self.active[columns] = active
+
+        # Welford: exact mean and variance over every sample
+        count += 1
+        delta = values - self.mean[columns]
+        mean = self.mean[columns] + delta / count
+        self.m2[columns] += delta * (values - mean)
+        self.mean[columns] = mean
+        self.count[columns] = count
+
+        # Exponentially weighted mean and variance over recent samples. Until an entity
+        # has about a half-life of samples they are weighted equally, so the estimates
+        # don't start out anchored to the first value.
+        alpha = np.maximum(self.alpha, 1 / count)
+        diff = values - ewma
+        increment = alpha * diff
+        self.ewma[columns] = ewma + increment
+        self.ewvar[columns] = (1 - alpha) * (ewvar + diff * increment)
+
+        # Each quantile estimate steps up by q or down by 1 - q, in proportion to the
+        # recent deviation, so it settles where a fraction q of samples fall below it
+        below = values < quantiles
+        quantiles += QUANTILE_RATE * alpha * scale * (self.quantile_levels - below)
+        self.quantiles[:, columns] = np.where(first, values, quantiles)
+
+        rows = np.flatnonzero(fired)
+        entity_rows = rows if self.entities.keys is None else columns[rows]
+        self.last_fired[entity_rows] = now
+        return Anomalies(self, entity_rows, values[rows], ewma[rows])
+
+    def stats(self, column):
+        count = int(self.count[column])
+        return {
+            'count': count,
+            'mean': float(self.mean[column]),
+            'std': float(np.sqrt(self.m2[column] / (count - 1))) if count > 1 else 0.0,
+            'recent_mean': float(self.ewma[column]),
+            'recent_std': float(np.sqrt(self.ewvar[column])),
+            'quantiles': dict(zip(QUANTILES, self.quantiles[:, column].tolist())),
+        }
+
+
+# Streaming anomaly detection over sensor channels. Each update() call takes one new
+# sample for any number of entities (rooms, homes) of a channel and checks them all
+# with a handful of array operations, so a fleet's worth of channels costs about
+# the same per sample as a single one.
+class AnomalyDetector:
+    def __init__(self, channels=DEFAULT_CHANNELS):
+        self._stats = {channel.name: _ChannelStats(channel) for channel in channels}
+        self._lock = threading.Lock()
+
+    @property
+    def channels(self):
+        return list(self._stats)
+
+    # Feed one sample per entity for `channel` and return the anomalies among them.
+    # `entities` names the entity of each value; when omitted, value i belongs to
+    # integer entity i. An entity may appear only once per call.
+    def update(self, channel, values, entities=None, now=None):
+        stats = self._stats[channel]
+        values = np.asarray(values, dtype=np.float64).reshape(-1)
+        now = time.time() if now is None else now
+        with self._lock:
+            columns = stats.columns(entities, len(values))
+            return stats.update(values, columns, now)
+
+    # Running statistics of one entity on `channel`, or None before its first sample
+    def stats(self, channel, entity):
+        stats = self._stats[channel]
+        with self._lock:
+            column = stats.entities.column(entity)
+            if column is None or not stats.count[column]:
+                return None
+            return stats.stats(column)
+
+    # Forget the active anomalies and cooldowns of `entity` (of every entity if None),
+    # so a condition that is still anomalous is reported again. The statistics are kept.
+    def reset(self, entity=None):
+        with self._lock:
+            for stats in self._stats.values():
+                column = slice(None) if entity is None else stats.entities.column(entity)
+                if column is not None:
+                    stats.active[column] = False
+                    stats.last_fired[column] = -np.inf
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure anomaly detection throughput at fleet scale")
+    parser.add_argument("--entities", type=int, default=50000)
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    detector = AnomalyDetector()
+    level = rng.normal(21.5, 1.5, args.entities)
+    update_times = []
+    found = 0
+    for i in range(args.samples):
+        values = level + rng.normal(0, 0.2, args.entities)
+        # Inject a burst of spikes after warmup
+        if i == args.samples - 1:
+            values[::1000] += 5
+        started = time.perf_counter()
+        found += len(detector.update('temperature', values, now=i * 2.0))
+        update_times.append(time.perf_counter() - started)
+
+    update_times = np.array(update_times)
+    print(f"{args.entities} entities, {args.samples} samples each, {found} anomalies "
+          f"({len(range(0, args.entities, 1000))} injected)")
+    print(f"update ms: mean {update_times.mean() * 1000:.3f}  p95 {np.percentile(update_times, 95) * 1000:.3f}  "
+          f"-> {args.entities / update_times.mean() / 1e6:.1f}M samples/s")
+    print("entity 0:", detector.stats('temperature', 0))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,34 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
 import time
 import random
+import math
+from functools import partial, wraps
 from datetime import datetime
-import hashlib
-
-# Function to check login credentials
-def check_login(username, password):
-    # Simple authentication (in a real app, use secure password hashing)
-    # Example credentials
-    valid_users = {
-        "admin": hashlib.md5("password123".encode()).hexdigest()
-    }
-    
-    # Hash the input password
-    hashed_password = hashlib.md5(password.encode()).hexdigest()
-    
-    return username in valid_users and valid_users[username] == hashed_password
+import os
+
+from activity_log import ActivityLog
+from alert_rules import RuleEngine
+from anomaly import AnomalyDetector
+from auth import Authenticator
+from camera_pipeline import CAPTURE_INTERVAL, CameraPipeline, SyntheticSource
+from change_feed import ChangeFeed
+from command_queue import CommandQueue
+from device_gateway import DeviceGateway, DeviceSnapshotCache, load_devices
+from energy import EnergyRollup, home_power
+from fleet import STATUSES, FleetTable
+from home_state import HomeState
+from irrigation_scheduler import IrrigationScheduler
+from persistence import SNAPSHOT_INTERVAL, StateStore
+from sensor_history import SensorHistory
+from thermal import ThermalModel
+import metrics
+import render
+from workers import PeriodicWorker
+
+# Password checks and session tokens, with the users file read once per process
+@st.cache_resource
+def get_authenticator():
+    return Authenticator(USERS_FILE)
 
 # Login Page
 def login_page():
@@ -40,15 +51,33 @@ def login_page():
     """, unsafe_allow_html=True)
     
     # Input fields directly without container
-    username = st.text_input("Username")
-    password = st.text_input("Password", type="password")
+    st.text_input("Username", key="login_username")
+    st.text_input("Password", type="password", key="login_password")
     
-    if st.button("Login"):
-        if check_login(username, password):
-            st.session_state.logged_in = True
-            st.experimental_rerun()
-        else:
-            st.error("Invalid username or password")
+    st.button("Login", on_click=login)
+    if st.session_state.login_error:
+        st.error(st.session_state.login_error)
+
+# Callback for the Login button; runs before the script so the dashboard renders in the same run
+@metrics.timed()
+def login():
+    result = get_authenticator().login(st.session_state.login_username, st.session_state.login_password)
+    st.session_state.login_password = ""
+    st.session_state.auth_token = result.token
+    if result.token:
+        st.session_state.login_error = None
+        metrics.increment("login:ok")
+    elif result.retry_after:
+        st.session_state.login_error = f"Too many login attempts. Try again in {math.ceil(result.retry_after)} s."
+        metrics.increment("login:limited")
+    else:
+        st.session_state.login_error = "Invalid username or password"
+        metrics.increment("login:failed")
+
+# Callback for the Logout button
+def logout():
+    st.session_state.auth_token = None
+    st.session_state.username = None
 
 # Set page config
 st.set_page_config(
@@ -71,493 +100,1036 @@ st.markdown("""
 .device-label {
     font-size: 16px;
 }
+.progress-track {
+    background-color: #f0f2f6;
+    border-radius: 4px;
+    height: 8px;
+    margin: 4px 0 12px 0;
+}
+.progress-fill {
+    background-color: #ff4b4b;
+    border-radius: 4px;
+    height: 8px;
+}
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state variables
-if 'logged_in' not in st.session_state:
-    st.session_state.logged_in = False
-
-if 'temperature' not in st.session_state:
-    st.session_state.temperature = 21.5
-
-if 'humidity' not in st.session_state:
-    st.session_state.humidity = 42
-
-if 'motion' not in st.session_state:
-    st.session_state.motion = False
-
-if 'lights' not in st.session_state:
-    st.session_state.lights = {'living': False, 'kitchen': True, 'bedroom': False}
+# Directory holding persistent data such as the activity log database
+DATA_DIR = os.environ.get("SMART_HOME_DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+# Seconds between sensor updates, and between refreshes of the sensor panels
+SENSOR_INTERVAL = 2
+
+# Number of points sent to the browser per chart line
+CHART_WIDTH = 600
+
+# Sensor trend periods, in hours
+TREND_PERIODS = {"Last hour": 1, "Last 6 hours": 6, "Last 24 hours": 24, "Last 48 hours": 48}
+
+# Built-in IoT devices with their connection status and additional details,
+# shown when no device list is configured
+IOT_DEVICES = [
+    {
+        "name": "Smart Refrigerator",
+        "status": "Connected",
+        "details": "Temperature: 3°C, Door: Closed",
+        "icon": "❄️"
+    },
+    {
+        "name": "Smart Microwave",
+        "status": "Connected",
+        "details": "Last Used: 22:30, Mode: Standby",
+        "icon": "🍽️"
+    },
+    {
+        "name": "Smart Washing Machine",
+        "status": "Offline",
+        "details": "Last Cycle: Completed, Ready to Start",
+        "icon": "🧺"
+    },
+    {
+        "name": "Smart Dishwasher",
+        "status": "Connected",
+        "details": "Cycle: Drying, Remaining: 15 min",
+        "icon": "🍽️"
+    },
+    {
+        "name": "Smart Oven",
+        "status": "Connected",
+        "details": "Temperature: 180°C, Mode: Bake",
+        "icon": "🥘"
+    },
+    {
+        "name": "Smart Coffee Maker",
+        "status": "Offline",
+        "details": "Last Brew: Morning, Descaling Needed",
+        "icon": "☕"
+    }
+]
 
-if 'thermostat' not in st.session_state:
-    st.session_state.thermostat = 22
+# Users and password hashes (see auth.py); without it only the default admin exists
+USERS_FILE = os.environ.get("SMART_HOME_USERS", os.path.join(DATA_DIR, "users.json"))
 
-if 'fan_speed' not in st.session_state:
-    st.session_state.fan_speed = 0
+# JSON device list polled by the IoT gateway (see device_gateway.py)
+DEVICES_FILE = os.environ.get("SMART_HOME_DEVICES")
 
-if 'alerts' not in st.session_state:
-    st.session_state.alerts = []
+# Devices shown per page on the IoT Devices tab
+IOT_PAGE_SIZE = 50
 
-if 'activity_log' not in st.session_state:
-    st.session_state.activity_log = []
+# Users who see the Metrics tab
+ADMIN_USERS = {"admin"}
 
-if 'last_update' not in st.session_state:
-    st.session_state.last_update = datetime.now().strftime("%H:%M:%S")
+# Prometheus text file the metrics are exported to, and how often (seconds)
+METRICS_FILE = os.path.join(DATA_DIR, "metrics.prom")
+METRICS_EXPORT_INTERVAL = 15
 
-if 'security_system' not in st.session_state:
-    st.session_state.security_system = 'disarmed'
+# Seconds between camera frames shown to one viewer
+CAMERA_REFRESH = 1.0
 
-if 'cameras' not in st.session_state:
-    st.session_state.cameras = {'front_door': True, 'backyard': False, 'garage': False}
+# Seconds an energy forecast is reused before it is simulated again
+FORECAST_INTERVAL = 300
 
-if 'door_status' not in st.session_state:
-    st.session_state.door_status = {'main': 'closed', 'garage': 'closed', 'back': 'closed'}
+# Number of homes in the fleet view; 0 turns the Fleet tab off
+FLEET_SIZE = int(os.environ.get("SMART_HOME_FLEET_SIZE", "0"))
+FLEET_PAGE_SIZE = 50
 
-if 'energy_data' not in st.session_state:
-    st.session_state.energy_data = {
-        'daily_usage': random.uniform(8, 15),
-        'weekly_total': random.uniform(50, 90),
-        'monthly_total': random.uniform(180, 250)
-    }
+# Home state sections shown outside any card (see card()), by tab. A change to one of
+# these reruns the whole script of the sessions showing it; changes to sections shown
+# in cards re-render only those cards.
+TAB_SECTIONS = {
+    "Security": ('cameras',),
+}
+# Change feed key touched by every new activity log entry
+ACTIVITY_KEY = (None, 'activity')
+
+# Weather forecast shown on the Irrigation tab (simplified)
+WEATHER_FORECAST = [
+    {"day": "Today", "icon": "☀️", "temp": "24°C", "precip": "0%"},
+    {"day": "Tomorrow", "icon": "⛅", "temp": "22°C", "precip": "10%"},
+    {"day": "Day 3", "icon": "🌧️", "temp": "19°C", "precip": "60%"},
+]
+
+# Per-session state as key -> (type, default). Device state lives in the shared
+# home state below. Bump SESSION_SCHEMA_VERSION whenever the schema changes so
+# sessions that are already open pick up the new keys.
+SESSION_SCHEMA_VERSION = 4
+SESSION_SCHEMA = {
+    # Signed session token from auth.py; the username is taken from it on every run
+    "auth_token": ((str, type(None)), None),
+    "login_error": ((str, type(None)), None),
+    "username": ((str, type(None)), None),
+    "current_tab": (str, "Dashboard"),
+    "activity_cursors": (list, lambda: [None]),
+    # Fleet row of the home being viewed, or None for the user's own home
+    "fleet_home": ((int, type(None)), None),
+    # Fragment ids of the cards rendered by the last full run, by change feed key
+    "card_fragments": (dict, dict),
+}
 
-if 'irrigation_zones' not in st.session_state:
-    st.session_state.irrigation_zones = {
-        'front_lawn': {'active': False, 'schedule': '06:00 AM', 'duration': 15},
-        'backyard': {'active': False, 'schedule': '07:00 AM', 'duration': 20},
-        'garden': {'active': False, 'schedule': '05:30 AM', 'duration': 10}
+# Fill in missing or mistyped session keys in one pass. After the first run of a
+# session only the version marker is checked.
+def init_session():
+    state = st.session_state
+    if state.get("session_schema_version") == SESSION_SCHEMA_VERSION:
+        return
+    for key, (kind, default) in SESSION_SCHEMA.items():
+        if key not in state or not isinstance(state[key], kind):
+            state[key] = default() if callable(default) else default
+    state.session_schema_version = SESSION_SCHEMA_VERSION
+
+init_session()
+
+# Energy rollups fed by the metering in update_sensors(), saved with the home
+# state snapshots
+@st.cache_resource
+def get_energy_rollup():
+    return EnergyRollup()
+
+# Shared home state, created once per process and used by every session. It is
+# restored from DATA_DIR/state on startup and every change is journaled there.
+@st.cache_resource
+def get_home_state():
+    home = HomeState()
+    store = StateStore(os.path.join(DATA_DIR, "state"), home, extras={'energy': get_energy_rollup()}).open()
+    PeriodicWorker("state-snapshots", SNAPSHOT_INTERVAL, store.snapshot).start()
+    return home
+
+# Sensor history ring buffers, shared the same way as the home state
+@st.cache_resource
+def get_sensor_history():
+    return SensorHistory()
+
+# Persistent activity log, shared the same way as the home state
+@st.cache_resource
+def get_activity_log():
+    return ActivityLog(os.path.join(DATA_DIR, "activity.db"))
+
+# Compiled alert rules; dedup and cooldown state is shared like the alerts themselves
+@st.cache_resource
+def get_alert_engine():
+    return RuleEngine()
+
+# Streaming statistics of the sensor channels, shared the same way as the alert rules
+@st.cache_resource
+def get_anomaly_detector():
+    return AnomalyDetector()
+
+# Chart index of local times for a sequence of epoch timestamps
+def local_index(timestamps):
+    import pandas as pd
+    local_tz = datetime.now().astimezone().tzinfo
+    return pd.to_datetime(timestamps, unit='s', utc=True).tz_convert(local_tz).tz_localize(None)
+
+# Latest IoT device snapshots. With SMART_HOME_DEVICES set, a background gateway
+# polls the listed devices into the cache; otherwise the built-in list is shown.
+@st.cache_resource
+def get_device_cache():
+    if not DEVICES_FILE:
+        return DeviceSnapshotCache(IOT_DEVICES)
+    devices = load_devices(DEVICES_FILE)
+    cache = DeviceSnapshotCache({"name": device["name"], "icon": device.get("icon", "🔌"),
+                                 "status": "Connecting", "details": ""} for device in devices)
+    DeviceGateway(devices, cache).start()
+    return cache
+
+# Thermal model of the home driving its temperature and HVAC draw, starting from
+# the last recorded temperature
+@st.cache_resource
+def get_thermal_model():
+    return ThermalModel(temperature=get_home_state().climate.temperature)
+
+# Energy tab figures, computed once per rollup version and shared by every session
+@st.cache_data(max_entries=4)
+def energy_summary(version):
+    import pandas as pd
+    summary = energy_rollup.summary(time.time())
+    summary['hourly'] = pd.DataFrame(
+        {'Energy (kWh)': [total for _, total in summary['hourly']]},
+        index=local_index([start for start, _ in summary['hourly']])
+    )
+    return summary
+
+# Broadcast of home state changes to the open sessions; fleet homes are attached
+# as they are opened
+@st.cache_resource
+def get_change_feed():
+    feed = ChangeFeed(quiet_ops=('sensors',))
+    feed.attach(get_home_state())
+    return feed
+
+home = get_home_state()
+thermal_model = get_thermal_model()
+device_cache = get_device_cache()
+energy_rollup = get_energy_rollup()
+alert_engine = get_alert_engine()
+anomaly_detector = get_anomaly_detector()
+sensor_history = get_sensor_history()
+activity_log = get_activity_log()
+change_feed = get_change_feed()
+
+# HVAC and fan energy over the next 24 hours with the given settings, simulated from
+# the thermal model's current state, next to the same with the thermostat 1°C lower.
+# `slot` changes every FORECAST_INTERVAL seconds so the forecast follows the home.
+@st.cache_data(max_entries=4)
+def energy_forecast(thermostat, fan_speed, lights, slot):
+    import numpy as np
+    import pandas as pd
+    forecast = thermal_model.copy(homes=2).fast_forward(24 * 3600, [thermostat, thermostat - 1], fan_speed, lights)
+    usage = forecast['hvac'] + forecast['fan']
+    totals = usage.sum(axis=0)
+    start = thermal_model.time
+    return {
+        'total': totals[0],
+        'saving': totals[0] - totals[1],
+        'hourly': pd.DataFrame({'Forecast (kWh)': usage[:, 0]},
+                               index=local_index(start + 3600 * np.arange(1, len(usage) + 1))),
     }
 
-if 'current_tab' not in st.session_state:
-    st.session_state.current_tab = "Dashboard"
-
-# Function to add to activity log
-def add_activity(message, entry_type="info"):
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    st.session_state.activity_log.insert(0, {"message": message, "time": timestamp, "type": entry_type})
-    if len(st.session_state.activity_log) > 10:
-        st.session_state.activity_log.pop()
+# Fleet of managed homes, generated once per process when SMART_HOME_FLEET_SIZE is set
+@st.cache_resource
+def get_fleet():
+    import numpy as np
+    return FleetTable(FLEET_SIZE, np.random.default_rng(0))
+
+# Alert rule engines of the fleet homes, by home name, created as homes are opened
+@st.cache_resource
+def get_fleet_alert_engines():
+    return {}
+
+def alert_engine_for(target):
+    if target is home:
+        return alert_engine
+    engines = get_fleet_alert_engines()
+    if target.name not in engines:
+        engines[target.name] = RuleEngine()
+    return engines[target.name]
+
+# Home this session is looking at: its own, or the fleet home it drilled into
+def current_home():
+    index = st.session_state.fleet_home
+    if index is None:
+        return home
+    target = get_fleet().home(index)
+    change_feed.attach(target)
+    return target
+
+# Rerun an open session from outside its script thread: only the given fragments, or
+# the whole script. Returns False once the session has closed, so the change feed
+# drops it.
+def rerun_session(session_id, fragment_ids=None):
+    from streamlit import runtime
+    if not runtime.exists():
+        return False
+    # Not public API: the session manager is the only way to reach another session.
+    # Missing when the script runs without a server (e.g. under AppTest).
+    instance = runtime.get_instance()
+    session_mgr = getattr(instance, "_session_mgr", None)
+    if session_mgr is None:
+        return False
+    if session_mgr.get_active_session_info(session_id) is None:
+        return False
+    # Sessions may only be touched from the server's event loop
+    instance._get_async_objs().eventloop.call_soon_threadsafe(
+        _rerun_on_event_loop, session_mgr, session_id, fragment_ids)
+    return True
+
+def _rerun_on_event_loop(session_mgr, session_id, fragment_ids):
+    from streamlit.runtime.scriptrunner import RerunData
+    session_info = session_mgr.get_active_session_info(session_id)
+    if session_info is None:
+        return
+    session = session_info.session
+    # A run in progress may be a full run that hasn't registered its fragments yet, so
+    # the fragments are only rerun on their own when the session is idle. This is what
+    # request_rerun() does for an idle session, with all the fragments in one run.
+    if fragment_ids and session._scriptrunner is None:
+        session._create_scriptrunner(RerunData(
+            query_string=session._client_state.query_string,
+            page_script_hash=session._client_state.page_script_hash,
+            fragment_id_queue=sorted(fragment_ids),
+        ))
+    else:
+        session.request_rerun(None)
+
+# Change feed callback of a session: rerun the cards showing the changed keys, or the
+# whole script when a change is shown outside any card
+def push_changes(session_id, cards, changed):
+    if not all(key in cards for key in changed):
+        return rerun_session(session_id)
+    return rerun_session(session_id, set().union(*(cards[key] for key in changed)))
+
+# Subscribe this session to the cards and sections it just rendered, replacing what
+# it watched on its previous run
+def watch_changes(target):
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx()
+    if ctx is None:
+        return
+    if st.session_state.username is None:
+        change_feed.unsubscribe(ctx.session_id)
+        return
+    cards = dict(st.session_state.card_fragments)
+    keys = set(cards)
+    keys.update((target.name, section) for section in TAB_SECTIONS.get(st.session_state.current_tab, ()))
+    change_feed.subscribe(ctx.session_id, keys, partial(push_changes, ctx.session_id, cards))
+
+# Decorator making a panel a card: a fragment that the change feed re-renders on its
+# own when one of `sections` of the home it shows (its first argument) changes. A
+# section may also be a whole change feed key, such as ACTIVITY_KEY.
+def card(*sections):
+    def decorate(panel):
+        @st.experimental_fragment
+        @wraps(panel)
+        def fragment(*args, **kwargs):
+            from streamlit.runtime.scriptrunner import get_script_run_ctx
+            ctx = get_script_run_ctx()
+            # Full runs tag the fragment with its id; its own reruns keep the same one
+            if ctx is not None and ctx.current_fragment_id is not None:
+                cards = st.session_state.card_fragments
+                for section in sections:
+                    key = section if isinstance(section, tuple) else (args[0].name, section)
+                    cards.setdefault(key, set()).add(ctx.current_fragment_id)
+            return panel(*args, **kwargs)
+        return fragment
+    return decorate
+
+# Home by name, for callbacks that run outside any session
+def home_named(name):
+    return home if name == home.name else get_fleet().home(FleetTable.index_of(name))
+
+# Function to add to activity log; entries about a fleet home are prefixed with its name
+@metrics.timed()
+def add_activity(message, entry_type="info", target=None):
+    if target is not None and target is not home:
+        message = f"{target.name}: {message}"
+    activity_log.append(message, entry_type)
+    change_feed.touch(ACTIVITY_KEY)
+    metrics.increment(f"activity:{entry_type}")
+
+# Function to evaluate alert rules for a channel and raise any alerts that fire
+@metrics.timed()
+def check_alerts(target, channel, values, entities, context=None):
+    for rule, entity, message in alert_engine_for(target).evaluate(channel, values, entities, context):
+        target.add_alert(message)
+        add_activity(message, "alert", target)
+        metrics.increment(f"alert:{rule.name}")
+
+# Function to feed one reading per channel to the anomaly detector and raise an alert
+# for each reading far outside the channel's recent behaviour
+@metrics.timed()
+def check_anomalies(target, readings, now):
+    for channel, value in readings.items():
+        for _, message in anomaly_detector.update(channel, [value], [target.name], now):
+            target.add_alert(message)
+            add_activity(message, "alert", target)
+            metrics.increment(f"anomaly:{channel}")
 
 # Function to toggle lights
-def toggle_light(room):
-    st.session_state.lights[room] = not st.session_state.lights[room]
-    status = "on" if st.session_state.lights[room] else "off"
-    add_activity(f"{room.capitalize()} light turned {status}", "light")
+@metrics.timed()
+def toggle_light(target, room):
+    status = "on" if target.toggle_light(room) else "off"
+    add_activity(f"{room.capitalize()} light turned {status}", "light", target)
 
 # Function to change thermostat
-def update_thermostat(new_value):
-    old_value = st.session_state.thermostat
-    st.session_state.thermostat = new_value
-    add_activity(f"Thermostat changed from {old_value}°C to {new_value}°C", "thermostat")
+@metrics.timed()
+def update_thermostat(target, new_value):
+    if new_value == target.climate.thermostat:
+        return
+    old_value = target.set_thermostat(new_value)
+    add_activity(f"Thermostat changed from {old_value}°C to {new_value}°C", "thermostat", target)
     
     # Check if thermostat is set too high
-    if new_value > 28 and not any("Thermostat set very high" in alert for alert in st.session_state.alerts):
-        st.session_state.alerts.append(f"Thermostat set very high: {new_value}°C")
+    check_alerts(target, "thermostat", [new_value], ["home"])
 
 # Function to change fan speed
-def update_fan_speed(new_speed):
-    old_speed = st.session_state.fan_speed
-    st.session_state.fan_speed = new_speed
+@metrics.timed()
+def update_fan_speed(target, new_speed):
+    if new_speed == target.climate.fan_speed:
+        return
+    old_speed = target.set_fan_speed(new_speed)
     speed_name = "Off" if new_speed == 0 else f"Level {new_speed}"
     old_speed_name = "Off" if old_speed == 0 else f"Level {old_speed}"
-    add_activity(f"Fan speed changed from {old_speed_name} to {speed_name}", "fan")
+    add_activity(f"Fan speed changed from {old_speed_name} to {speed_name}", "fan", target)
+
+# Function to switch a light to a given state, if it isn't there already
+def switch_light(target, room, on):
+    if target.lights[room] != on:
+        toggle_light(target, room)
+
+# UI callbacks for the high-frequency controls. They queue the target value and the
+# command queue applies the last one of a burst, so a slider drag or a run of clicks
+# becomes one state change and one log entry.
+def queue_thermostat(target):
+    get_command_queue().submit((target.name, "thermostat"), st.session_state.thermostat_slider,
+                               partial(update_thermostat, target))
+
+def queue_fan_speed(target, level):
+    get_command_queue().submit((target.name, "fan_speed"), level, partial(update_fan_speed, target))
+
+def queue_light_toggle(target, room):
+    queue = get_command_queue()
+    on = not queue.pending((target.name, "light", room), target.lights[room])
+    queue.submit((target.name, "light", room), on, partial(switch_light, target, room))
 
 # Function to toggle camera
-def toggle_camera(camera):
-    st.session_state.cameras[camera] = not st.session_state.cameras[camera]
-    status = "on" if st.session_state.cameras[camera] else "off"
-    add_activity(f"{camera.replace('_', ' ').capitalize()} camera turned {status}", "security")
+@metrics.timed()
+def toggle_camera(target, camera):
+    status = "on" if target.toggle_camera(camera) else "off"
+    add_activity(f"{camera.replace('_', ' ').capitalize()} camera turned {status}", "security", target)
 
 # Function to change security system status
-def update_security_system(new_status):
-    old_status = st.session_state.security_system
-    st.session_state.security_system = new_status
-    add_activity(f"Security system changed from {old_status} to {new_status}", "security")
+@metrics.timed()
+def update_security_system(target, new_status):
+    old_status = target.set_security_system(new_status)
+    add_activity(f"Security system changed from {old_status} to {new_status}", "security", target)
 
 # Function to update door status
-def update_door(door, status):
-    old_status = st.session_state.door_status[door]
-    st.session_state.door_status[door] = status
-    add_activity(f"{door.capitalize()} door {status}", "security")
+@metrics.timed()
+def update_door(target, door, status):
+    target.set_door(door, status)
+    add_activity(f"{door.capitalize()} door {status}", "security", target)
     
     # Add alert if door is opened while security system is armed
-    if status == "open" and st.session_state.security_system != "disarmed":
-        alert_message = f"Security alert: {door} door opened while system armed!"
-        st.session_state.alerts.append(alert_message)
-        add_activity(alert_message, "alert")
-
-# Function to toggle irrigation zone
-def toggle_irrigation(zone):
-    st.session_state.irrigation_zones[zone]['active'] = not st.session_state.irrigation_zones[zone]['active']
-    status = "activated" if st.session_state.irrigation_zones[zone]['active'] else "deactivated"
-    add_activity(f"{zone.replace('_', ' ').capitalize()} irrigation zone {status}", "irrigation")
+    check_alerts(target, "door_open", [status == "open"], [door],
+                 context={"armed": target.security_system != "disarmed"})
+
+# Scheduler callbacks: record a zone starting or stopping in the home state and the log.
+# Zones are keyed by (home name, zone).
+def irrigation_started(key, duration):
+    target, zone = home_named(key[0]), key[1]
+    if target.set_irrigation_active(zone, True):
+        add_activity(f"{zone.replace('_', ' ').capitalize()} irrigation zone activated for {duration:g} min", "irrigation", target)
+
+def irrigation_stopped(key):
+    target, zone = home_named(key[0]), key[1]
+    if target.set_irrigation_active(zone, False):
+        add_activity(f"{zone.replace('_', ' ').capitalize()} irrigation zone deactivated", "irrigation", target)
+
+# Function to toggle irrigation zone; the scheduler runs it for its configured duration.
+# Toggling a zone queued behind another one cancels the queued run.
+@metrics.timed()
+def toggle_irrigation(target, zone):
+    scheduler = get_irrigation_scheduler()
+    data = target.irrigation_zones[zone]
+    if data.active:
+        scheduler.stop_now((target.name, zone))
+    elif scheduler.queued((target.name, zone)):
+        scheduler.stop_now((target.name, zone))
+        add_activity(f"{zone.replace('_', ' ').capitalize()} irrigation zone run cancelled", "irrigation", target)
+    elif not scheduler.start_now((target.name, zone), data.duration):
+        add_activity(f"{zone.replace('_', ' ').capitalize()} irrigation zone queued until the running zone finishes", "irrigation", target)
 
 # Function to update irrigation schedule
-def update_irrigation_schedule(zone, schedule, duration):
-    st.session_state.irrigation_zones[zone]['schedule'] = schedule
-    st.session_state.irrigation_zones[zone]['duration'] = duration
-    add_activity(f"{zone.replace('_', ' ').capitalize()} irrigation schedule updated", "irrigation")
+@metrics.timed()
+def update_irrigation_schedule(target, zone, schedule, duration):
+    target.set_irrigation_schedule(zone, schedule, duration)
+    get_irrigation_scheduler().schedule((target.name, zone), schedule, duration)
+    add_activity(f"{zone.replace('_', ' ').capitalize()} irrigation schedule updated", "irrigation", target)
+
+# Callback for a zone's Update Schedule button, reading the zone's time and duration inputs
+def apply_irrigation_schedule(target, zone):
+    schedule = st.session_state[f"time_{zone}"].strftime("%I:%M %p")
+    update_irrigation_schedule(target, zone, schedule, st.session_state[f"duration_{zone}"])
+
+# Function to clear all alerts
+@metrics.timed()
+def clear_alerts(target):
+    target.clear_alerts()
+    alert_engine_for(target).reset()
+    anomaly_detector.reset(target.name)
+    add_activity("All alerts cleared", "system", target)
 
 # Simulate sensor updates
+@metrics.timed()
 def update_sensors():
-    # Update temperature with small random changes
-    temp_change = (random.random() - 0.5) * 0.8
-    st.session_state.temperature = round(st.session_state.temperature + temp_change, 1)
+    climate = home.climate
+    now = time.time()
+
+    # Advance the thermal model under the current thermostat, fan and lights, and read
+    # the temperature with a little sensor noise
+    lights = [home.lights[room] for room in thermal_model.rooms]
+    hvac_kw = float(thermal_model.advance(now, climate.thermostat, climate.fan_speed, lights)[0])
+    temperature = round(float(thermal_model.mean_temperature()[0]) + (random.random() - 0.5) * 0.1, 1)
 
     # Update humidity with small random changes
     humidity_change = (random.random() - 0.5) * 2
-    st.session_state.humidity = min(max(round(st.session_state.humidity + humidity_change), 30), 70)
+    humidity = min(max(round(climate.humidity + humidity_change), 30), 70)
 
     # Random motion detection (10% chance)
-    if random.random() < 0.1:
-        if not st.session_state.motion:
-            st.session_state.motion = True
-            add_activity("Motion detected", "motion")
+    motion = random.random() < 0.1
+    if home.update_sensors(temperature, humidity, motion):
+        add_activity("Motion detected", "motion")
+    sensor_history.record(now, temperature=temperature, humidity=humidity, motion=float(motion))
+
+    # Meter each device's current draw
+    power = home_power(home, hvac_kw)
+    energy_rollup.ingest_power(power, now)
+
+    # Check for temperature alerts, and for readings unlike the recent ones
+    check_alerts(home, "temperature", [temperature], ["indoor"])
+    check_anomalies(home, {'temperature': temperature, 'humidity': humidity, 'motion_rate': float(motion),
+                           'power': sum(power.values())}, now)
+
+# Activity log entry types that can be filtered on
+ACTIVITY_TYPES = ["All", "Alert", "Security", "Light", "Thermostat", "Fan", "Motion", "Irrigation", "System"]
+
+# Paged view of the activity log. The cursors of the pages already visited are kept
+# in the session so "Newer" can step back without re-querying from the start.
+@card(ACTIVITY_KEY)
+@metrics.timed()
+def activity_panel(page_size=50):
+    filter_cols = st.columns([1, 2, 1, 1])
+    with filter_cols[0]:
+        entry_type = st.selectbox("Type", ACTIVITY_TYPES, key="activity_type",
+                                  on_change=lambda: st.session_state.update(activity_cursors=[None]))
+    cursors = st.session_state.activity_cursors
+    entries, next_cursor = activity_log.query(
+        entry_type=None if entry_type == "All" else entry_type.lower(),
+        limit=page_size, before=cursors[-1]
+    )
+    with filter_cols[2]:
+        st.button("Newer", key="activity_newer", disabled=len(cursors) == 1, use_container_width=True,
+                  on_click=cursors.pop)
+    with filter_cols[3]:
+        st.button("Older", key="activity_older", disabled=next_cursor is None, use_container_width=True,
+                  on_click=cursors.append, args=(next_cursor,))
+
+    if not entries:
+        st.markdown("No activity recorded yet.")
     else:
-        if st.session_state.motion:
-            st.session_state.motion = False
+        st.markdown("".join(
+            f"<div class='device-label'><span style='color: gray;'>{entry['time']}</span> "
+            f"[{entry['type']}] {entry['message']}</div>" for entry in entries
+        ), unsafe_allow_html=True)
+
+# Callback for the tab buttons
+def select_tab(tab):
+    st.session_state.current_tab = tab
+
+# Active alerts. New alerts reach open sessions through the change feed, so this
+# isn't polled.
+@card('alerts')
+@metrics.timed()
+def status_panel(target):
+    # Display alerts if any
+    if target.alerts:
+        st.markdown(render.alerts_card(target), unsafe_allow_html=True)
 
-    # Check for temperature alerts
-    if st.session_state.temperature > 26 and not any("Temperature above normal" in alert for alert in st.session_state.alerts):
-        alert_message = f"Temperature above normal: {st.session_state.temperature}°C"
-        st.session_state.alerts.append(alert_message)
-        add_activity(alert_message, "alert")
+        # Add clear alerts button
+        st.button("Clear Alerts", on_click=clear_alerts, args=(target,))
+
+# Thermostat, fan and light controls
+@card('climate', 'lights')
+@metrics.timed()
+def controls_panel(target):
+    st.subheader("🎮 Device Control")
+    # Thermostat Control, showing a setpoint still waiting in the command queue
+    command_queue = get_command_queue()
+    thermostat = command_queue.pending((target.name, "thermostat"), target.climate.thermostat)
+    st.markdown(f"<div class='device-label'>🌡️ Thermostat <span class='sensor-value'>{thermostat}°C</span></div>", unsafe_allow_html=True)
+    # Follow setpoint changes made by other sessions; this session's own drags
+    # are queued by the on_change callback before the script runs
+    if st.session_state.get("thermostat_slider") != thermostat:
+        st.session_state.thermostat_slider = thermostat
+    st.slider("", 16, 30, key="thermostat_slider", label_visibility="collapsed",
+              on_change=queue_thermostat, args=(target,))
+
+    # Fan Control
+    st.markdown("<div class='device-label'>🌀 Fan Speed</div>", unsafe_allow_html=True)
+    fan_options = {0: "Off", 1: "Low", 2: "Medium", 3: "High"}
+    fan_cols = st.columns(4)
+    for i, (level, label) in enumerate(fan_options.items()):
+        with fan_cols[i]:
+            st.button(label, key=f"fan_{level}", use_container_width=True,
+                      on_click=queue_fan_speed, args=(target, level))
+
+    # Light Controls
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown("<div class='device-label'>💡 Lights</div>", unsafe_allow_html=True)
+    for room, is_on in target.lights.items():
+        is_on = command_queue.pending((target.name, "light", room), is_on)
+        status = "On" if is_on else "Off"
+        status_color = "green" if is_on else "gray"
+        light_cols = st.columns([3, 1])
+        with light_cols[0]:
+            st.markdown(f"<div class='device-label'>{room.capitalize()} <span style='color: {status_color};'>{status}</span></div>", unsafe_allow_html=True)
+        with light_cols[1]:
+            st.button("Toggle", key=f"light_{room}", use_container_width=True,
+                      on_click=queue_light_toggle, args=(target, room))
+
+# Security system status and door controls
+@card('security', 'doors')
+@metrics.timed()
+def security_panel(target):
+    st.subheader("🔐 Security System")
+
+    # Security system status
+    status_color = {
+        'disarmed': 'gray',
+        'armed_home': 'orange',
+        'armed_away': 'green'
+    }[target.security_system]
+
+    st.markdown(f"<div class='device-label'>System Status <span class='sensor-value' style='color: {status_color};'>{target.security_system.replace('_', ' ').capitalize()}</span></div>", unsafe_allow_html=True)
+
+    # Security system controls
+    security_cols = st.columns(3)
+    with security_cols[0]:
+        st.button("Disarm", key="disarm_system", use_container_width=True,
+                  on_click=update_security_system, args=(target, "disarmed"))
+    with security_cols[1]:
+        st.button("Arm (Home)", key="arm_home", use_container_width=True,
+                  on_click=update_security_system, args=(target, "armed_home"))
+    with security_cols[2]:
+        st.button("Arm (Away)", key="arm_away", use_container_width=True,
+                  on_click=update_security_system, args=(target, "armed_away"))
+
+    # Door controls
+    st.markdown("<br>", unsafe_allow_html=True)
+    st.markdown("<div class='device-label'>🚪 Door Controls</div>", unsafe_allow_html=True)
+    for door, status in target.doors.items():
+        door_color = "red" if status == "open" else "green"
+        door_cols = st.columns([2, 1, 1])
+        with door_cols[0]:
+            st.markdown(f"<div class='device-label'>{door.capitalize()} <span style='color: {door_color};'>{status.capitalize()}</span></div>", unsafe_allow_html=True)
+        with door_cols[1]:
+            st.button("Open", key=f"open_{door}", use_container_width=True,
+                      on_click=update_door, args=(target, door, "open"))
+        with door_cols[2]:
+            st.button("Close", key=f"close_{door}", use_container_width=True,
+                      on_click=update_door, args=(target, door, "closed"))
+
+# Irrigation zones with their schedules and controls
+@card('irrigation')
+@metrics.timed()
+def irrigation_panel(target):
+    for zone, data in target.irrigation_zones.items():
+        zone_status = "Active" if data['active'] else "Inactive"
+        zone_color = "green" if data['active'] else "gray"
+        st.markdown(f"<div class='device-label'><b>{zone.replace('_', ' ').capitalize()}</b> <span style='color: {zone_color};'>{zone_status}</span></div>", unsafe_allow_html=True)
+        
+        zone_cols = st.columns([2, 1, 1])
+        with zone_cols[0]:
+            st.markdown(f"Schedule: {data['schedule']}, Duration: {data['duration']} min")
+        
+        with zone_cols[1]:
+            st.time_input(f"New time", label_visibility="collapsed", key=f"time_{zone}")
+        
+        with zone_cols[2]:
+            st.number_input(f"Duration (min)", min_value=5, max_value=60, 
+                            value=data['duration'], step=5, 
+                            label_visibility="collapsed", 
+                            key=f"duration_{zone}")
+        
+        control_cols = st.columns([3, 1, 1])
+        with control_cols[1]:
+            st.button("Update Schedule", key=f"update_{zone}", use_container_width=True,
+                      on_click=apply_irrigation_schedule, args=(target, zone))
+        
+        with control_cols[2]:
+            st.button("Toggle", key=f"toggle_{zone}", use_container_width=True,
+                      on_click=toggle_irrigation, args=(target, zone))
+        
+        st.markdown("<hr>", unsafe_allow_html=True)
+
+# Last update time, sensor readings and door statuses, refreshed on the sensor
+# timer: readings stream in too often to push
+@st.experimental_fragment(run_every=SENSOR_INTERVAL)
+@metrics.timed()
+def sensor_panel():
+    target = current_home()
+    st.markdown(f"<p style='text-align: right; color: gray; font-size: 0.8rem;'>Last updated: {target.climate.last_update}</p>", unsafe_allow_html=True)
+    st.markdown(render.sensor_card(target), unsafe_allow_html=True)
+
+# Live thumbnail of one camera. Each viewer re-renders it at most every CAMERA_REFRESH
+# seconds and only fetches the frame the capture worker already encoded.
+@st.experimental_fragment(run_every=CAMERA_REFRESH)
+def camera_feed(camera):
+    frame = get_camera_pipeline().latest(camera)
+    if frame is None:
+        st.markdown(f"<div style='background-color: #d1d1d1; height: 120px; border-radius: 5px; margin-bottom: 10px; display: flex; justify-content: center; align-items: center;'><p style='color: #555;'>Connecting to {camera.replace('_', ' ')} camera...</p></div>", unsafe_allow_html=True)
+    else:
+        st.image(frame.jpeg, caption=f"Camera Feed: {camera.replace('_', ' ').capitalize()}",
+                 use_column_width=True)
+
+# Chart of one sensor channel over the selected period
+def sensor_trends():
+    trend_cols = st.columns([1, 1, 2])
+    with trend_cols[0]:
+        channel = st.selectbox("Sensor", [c.capitalize() for c in SensorHistory.CHANNELS], key="trend_channel")
+    with trend_cols[1]:
+        period = st.selectbox("Period", list(TREND_PERIODS), key="trend_period")
+    start = time.time() - TREND_PERIODS[period] * 3600
+    times, mins, maxs, means = sensor_history[channel.lower()].downsample(CHART_WIDTH, start=start)
+    if len(times):
+        import pandas as pd
+        st.line_chart(pd.DataFrame({'Min': mins, 'Mean': means, 'Max': maxs},
+                                   index=local_index(times)))
+    else:
+        st.markdown("No readings yet.")
+
+# Whether the logged-in user may see the Metrics tab
+def is_admin():
+    return st.session_state.username in ADMIN_USERS
+
+# Timings and event counts gathered by metrics.py, slowest code paths first
+def metrics_panel():
+    import pandas as pd
+    st.subheader("📈 Metrics")
+    if not metrics.ENABLED:
+        st.markdown("Instrumentation is off (SMART_HOME_METRICS=0).")
+        return
+    histograms, counters = metrics.registry.snapshot()
+    timings = pd.DataFrame(
+        [{"Code path": name, "Calls": h.count, "Total (s)": h.sum, "Mean (ms)": h.sum / h.count * 1000,
+          "p95 (ms)": h.quantile(0.95) * 1000, "Max (ms)": h.max * 1000}
+         for name, h in histograms.items() if h.count],
+        columns=["Code path", "Calls", "Total (s)", "Mean (ms)", "p95 (ms)", "Max (ms)"]
+    )
+    st.dataframe(timings.sort_values("Total (s)", ascending=False), hide_index=True, use_container_width=True)
+    st.dataframe(pd.DataFrame(sorted(counters.items()), columns=["Event", "Count"]),
+                 hide_index=True, use_container_width=True)
+    st.caption(f"Exported every {METRICS_EXPORT_INTERVAL} s to {METRICS_FILE}")
+
+# What the anomaly detector currently considers normal for the user's own home
+def baselines_panel():
+    import pandas as pd
+    st.subheader("📉 Sensor Baselines")
+    baselines = []
+    for channel in anomaly_detector.channels:
+        stats = anomaly_detector.stats(channel, home.name)
+        if stats is not None:
+            low, high = stats['quantiles'].values()
+            baselines.append({"Channel": channel, "Samples": stats['count'], "Mean": stats['mean'],
+                              "Std": stats['std'], "Recent mean": stats['recent_mean'],
+                              "Recent std": stats['recent_std'], "Low": low, "High": high})
+    st.dataframe(pd.DataFrame(baselines), hide_index=True, use_container_width=True)
+
+# Callback switching this session to a fleet home's dashboard, or back to its own (None)
+def open_home(index):
+    st.session_state.fleet_home = index
+    st.session_state.current_tab = "Dashboard"
 
-    # Update timestamp
-    st.session_state.last_update = datetime.now().strftime("%H:%M:%S")
+# Fleet overview: status counts, a filtered page of homes, and drill-down into one
+@metrics.timed()
+def fleet_panel():
+    import pandas as pd
+    fleet = get_fleet()
+    st.subheader("🏘️ Fleet")
+    counts = fleet.counts()
+    count_cols = st.columns(len(STATUSES) + 1)
+    count_cols[0].metric("Homes", f"{fleet.size:,}")
+    for col, (status, label) in zip(count_cols[1:], STATUSES.items()):
+        col.metric(label, f"{counts[status]:,}")
+
+    labels = st.multiselect("Show homes that are", list(STATUSES.values()), key="fleet_filter",
+                            on_change=lambda: st.session_state.update(fleet_page=1))
+    statuses = [status for status, label in STATUSES.items() if label in labels]
+    _, total = fleet.query(statuses, limit=0)
+    page_count = max(1, -(-total // FLEET_PAGE_SIZE))
+    page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key="fleet_page")
+    rows, _ = fleet.query(statuses, offset=(page - 1) * FLEET_PAGE_SIZE, limit=FLEET_PAGE_SIZE)
+    if not len(rows):
+        st.markdown("No homes match.")
+        return
+    st.caption(f"{total:,} homes match")
+    st.dataframe(pd.DataFrame(fleet.rows(rows)), hide_index=True, use_container_width=True)
+
+    # Drill down into one home on this page
+    open_cols = st.columns([3, 1])
+    with open_cols[0]:
+        name = st.selectbox("Home", [FleetTable.name(row) for row in rows], key="fleet_pick",
+                            label_visibility="collapsed")
+    with open_cols[1]:
+        st.button("Open dashboard", key="fleet_open", use_container_width=True,
+                  on_click=open_home, args=(FleetTable.index_of(name),))
 
 # Main dashboard content
 def main_dashboard():
     # Logout button and title row
     col1, col2, col3 = st.columns([3, 2, 1])
     with col3:
-        if st.button("Logout", key="main_logout", use_container_width=True):
-            st.session_state.logged_in = False
-            st.experimental_rerun()
+        st.button("Logout", key="main_logout", use_container_width=True, on_click=logout)
 
     # Main title bar
     st.title("🏠 Smart Home Control Panel")
-    st.markdown(f"<p style='text-align: right; color: gray; font-size: 0.8rem;'>Last updated: {st.session_state.last_update}</p>", unsafe_allow_html=True)
-
-    # Update data every time the page is loaded
-    update_sensors()
 
-    # Display alerts if any
-    if st.session_state.alerts:
-        for alert in st.session_state.alerts:
-            st.markdown(f"<div class='alert'><strong>⚠️ Alert:</strong> {alert}</div>", unsafe_allow_html=True)
+    # Home the tabs below act on
+    target = current_home()
+    if target is not home:
+        banner_cols = st.columns([4, 1])
+        with banner_cols[0]:
+            st.info(f"Viewing {target.name} from the fleet")
+        with banner_cols[1]:
+            st.button("Back to my home", key="fleet_back", use_container_width=True,
+                      on_click=open_home, args=(None,))
 
-        # Add clear alerts button
-        if st.button("Clear Alerts"):
-            st.session_state.alerts = []
-            add_activity("All alerts cleared", "system")
-            st.experimental_rerun()
+    # Active alerts
+    status_panel(target)
 
     # Create tabs using buttons
     tabs = ["Dashboard", "Security", "Energy", "Irrigation", "IoT Devices"]
+    if FLEET_SIZE:
+        tabs.append("Fleet")
+    if is_admin():
+        tabs.append("Metrics")
     cols = st.columns(len(tabs))
 
     for i, tab in enumerate(tabs):
-        active_class = "tab-button-active" if st.session_state.current_tab == tab else ""
-        if cols[i].button(tab, key=f"tab_{tab}", use_container_width=True):
-            st.session_state.current_tab = tab
-            st.experimental_rerun()
+        button_type = "primary" if st.session_state.current_tab == tab else "secondary"
+        cols[i].button(tab, key=f"tab_{tab}", type=button_type, use_container_width=True,
+                       on_click=select_tab, args=(tab,))
 
     # Dashboard tab content
     if st.session_state.current_tab == "Dashboard":
         col1, col2 = st.columns(2)
 
         with col1:
-            st.markdown("<div class='card'>", unsafe_allow_html=True)
-            st.subheader("📊 Sensor Data")
-            # Temperature
-            temp_color = "red" if st.session_state.temperature > 25 else "black"
-            st.markdown(f"<div class='device-label'>🌡️ Temperature <span class='sensor-value' style='color: {temp_color};'>{st.session_state.temperature}°C</span></div>", unsafe_allow_html=True)
-            st.progress((st.session_state.temperature - 15) / 20)
-
-            # Humidity
-            st.markdown(f"<div class='device-label'>💧 Humidity <span class='sensor-value'>{st.session_state.humidity}%</span></div>", unsafe_allow_html=True)
-            st.progress(st.session_state.humidity / 100)
-
-            # Motion
-            motion_status = "Detected" if st.session_state.motion else "None"
-            motion_color = "green" if st.session_state.motion else "gray"
-            st.markdown(f"<div class='device-label'>📡 Motion <span class='sensor-value' style='color: {motion_color};'>{motion_status}</span></div>", unsafe_allow_html=True)
-
-            # Door statuses
-            for door, status in st.session_state.door_status.items():
-                door_color = "red" if status == "open" else "green"
-                st.markdown(f"<div class='device-label'>🚪 {door.capitalize()} Door <span class='sensor-value' style='color: {door_color};'>{status.capitalize()}</span></div>", unsafe_allow_html=True)
-            st.markdown("</div>", unsafe_allow_html=True)
+            sensor_panel()
 
         with col2:
-            st.markdown("<div class='card'>", unsafe_allow_html=True)
-            st.subheader("🎮 Device Control")
-            # Thermostat Control
-            st.markdown(f"<div class='device-label'>🌡️ Thermostat <span class='sensor-value'>{st.session_state.thermostat}°C</span></div>", unsafe_allow_html=True)
-            new_thermostat = st.slider("", 16, 30, st.session_state.thermostat, key="thermostat_slider", label_visibility="collapsed")
-            if new_thermostat != st.session_state.thermostat:
-                update_thermostat(new_thermostat)
-
-            # Fan Control
-            st.markdown("<div class='device-label'>🌀 Fan Speed</div>", unsafe_allow_html=True)
-            fan_options = {0: "Off", 1: "Low", 2: "Medium", 3: "High"}
-            fan_cols = st.columns(4)
-            for i, (level, label) in enumerate(fan_options.items()):
-                with fan_cols[i]:
-                    if st.button(label, key=f"fan_{level}", use_container_width=True):
-                        update_fan_speed(level)
-
-            # Light Controls
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.markdown("<div class='device-label'>💡 Lights</div>", unsafe_allow_html=True)
-            for room in st.session_state.lights:
-                status = "On" if st.session_state.lights[room] else "Off"
-                status_color = "green" if st.session_state.lights[room] else "gray"
-                st.markdown(f"<div class='device-label'>{room.capitalize()} <span style='color: {status_color};'>{status}</span></div>", unsafe_allow_html=True)
-                light_cols = st.columns([3, 1])
-                with light_cols[0]:
-                    st.markdown(f"<div style='height: 5px;'></div>", unsafe_allow_html=True)
-                with light_cols[1]:
-                    if st.button("Toggle", key=f"light_{room}", use_container_width=True):
-                        toggle_light(room)
-            st.markdown("</div>", unsafe_allow_html=True)
+            controls_panel(target)
+
+        # Sensor trends, downsampled to roughly one point per chart pixel
+        st.subheader("📈 Sensor Trends")
+        if target is home:
+            sensor_trends()
+        else:
+            st.markdown("Sensor history is only recorded for your own home.")
+
+        # Recent activity, paged from the persistent log
+        st.subheader("📝 Recent Activity")
+        activity_panel()
 
     # Security tab content
     elif st.session_state.current_tab == "Security":
         col1, col2 = st.columns(2)
 
         with col1:
-            st.markdown("<div class='card'>", unsafe_allow_html=True)
-            st.subheader("🔐 Security System")
-
-            # Security system status
-            status_color = {
-                'disarmed': 'gray',
-                'armed_home': 'orange',
-                'armed_away': 'green'
-            }[st.session_state.security_system]
-
-            st.markdown(f"<div class='device-label'>System Status <span class='sensor-value' style='color: {status_color};'>{st.session_state.security_system.replace('_', ' ').capitalize()}</span></div>", unsafe_allow_html=True)
-
-            # Security system controls
-            security_cols = st.columns(3)
-            with security_cols[0]:
-                if st.button("Disarm", key="disarm_system", use_container_width=True):
-                    update_security_system("disarmed")
-            with security_cols[1]:
-                if st.button("Arm (Home)", key="arm_home", use_container_width=True):
-                    update_security_system("armed_home")
-            with security_cols[2]:
-                if st.button("Arm (Away)", key="arm_away", use_container_width=True):
-                    update_security_system("armed_away")
-
-            # Door controls
-            st.markdown("<br>", unsafe_allow_html=True)
-            st.markdown("<div class='device-label'>🚪 Door Controls</div>", unsafe_allow_html=True)
-            for door, status in st.session_state.door_status.items():
-                door_color = "red" if status == "open" else "green"
-                st.markdown(f"<div class='device-label'>{door.capitalize()} <span style='color: {door_color};'>{status.capitalize()}</span></div>", unsafe_allow_html=True)
-                door_cols = st.columns(2)
-                with door_cols[0]:
-                    if st.button("Open", key=f"open_{door}", use_container_width=True):
-                        update_door(door, "open")
-                with door_cols[1]:
-                    if st.button("Close", key=f"close_{door}", use_container_width=True):
-                        update_door(door, "closed")
-            st.markdown("</div>", unsafe_allow_html=True)
+            security_panel(target)
 
         with col2:
-            st.markdown("<div class='card'>", unsafe_allow_html=True)
             st.subheader("📹 Security Cameras")
 
             # Camera controls
-            for camera, status in st.session_state.cameras.items():
+            for camera, status in target.cameras.items():
                 camera_status = "On" if status else "Off"
                 camera_color = "green" if status else "gray"
-                st.markdown(f"<div class='device-label'>{camera.replace('_', ' ').capitalize()} <span style='color: {camera_color};'>{camera_status}</span></div>", unsafe_allow_html=True)
                 camera_cols = st.columns([3, 1])
                 with camera_cols[0]:
-                    st.markdown(f"<div style='height: 5px;'></div>", unsafe_allow_html=True)
+                    st.markdown(f"<div class='device-label'>{camera.replace('_', ' ').capitalize()} <span style='color: {camera_color};'>{camera_status}</span></div>", unsafe_allow_html=True)
                 with camera_cols[1]:
-                    if st.button("Toggle", key=f"camera_{camera}", use_container_width=True):
-                        toggle_camera(camera)
-                if status:
+                    st.button("Toggle", key=f"camera_{camera}", use_container_width=True,
+                              on_click=toggle_camera, args=(target, camera))
+                if status and target is home:
+                    camera_feed(camera)
+                elif status:
                     # Placeholder for camera feed
-                    st.markdown(f"<div style='background-color: #d1d1d1; height: 120px; border-radius: 5px; display: flex; justify-content: center; align-items: center;'><p style='color: #555;'>Camera Feed: {camera.replace('_', ' ').capitalize()}</p></div>", unsafe_allow_html=True)
-                st.markdown("<div style='height: 10px;'></div>", unsafe_allow_html=True)
-            st.markdown("</div>", unsafe_allow_html=True)
+                    st.markdown(f"<div style='background-color: #d1d1d1; height: 120px; border-radius: 5px; margin-bottom: 10px; display: flex; justify-content: center; align-items: center;'><p style='color: #555;'>Camera Feed: {camera.replace('_', ' ').capitalize()}</p></div>", unsafe_allow_html=True)
 
     # Energy tab content
     elif st.session_state.current_tab == "Energy":
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.subheader("⚡ Energy Usage")
-
-        # Display current energy metrics
-        col1, col2, col3 = st.columns(3)
-        with col1:
-            st.metric(label="Today's Usage", 
-                      value=f"{st.session_state.energy_data['daily_usage']:.2f} kWh", 
-                      delta=f"{(random.random() - 0.6) * 2:.2f} kWh")
-        with col2:
-            st.metric(label="This Week", 
-                      value=f"{st.session_state.energy_data['weekly_total']:.2f} kWh", 
-                      delta=f"{(random.random() - 0.55) * 5:.2f} kWh")
-        with col3:
-            st.metric(label="This Month", 
-                      value=f"{st.session_state.energy_data['monthly_total']:.2f} kWh", 
-                      delta=f"{(random.random() - 0.52) * 10:.2f} kWh")
-
-        # Create sample energy data for chart
-        energy_times = [f"{i}:00" for i in range(24)]
-        energy_values = [random.uniform(0.2, 1.5) for _ in range(24)]
-        energy_values[7] = 2.1  # Morning peak
-        energy_values[8] = 1.9
-        energy_values[18] = 2.3  # Evening peak
-        energy_values[19] = 2.5
-        energy_values[20] = 2.2
-
-        # Create a chart
-        st.line_chart(pd.DataFrame({'Energy (kWh)': energy_values}, index=energy_times))
+        thermostat_tip = "Reduce thermostat by 1°C to save up to 10% on heating costs"
+        if target is not home:
+            st.markdown("Energy is only metered for your own home.")
+        else:
+            # Display current energy metrics, compared with the same point of the previous period
+            summary = energy_summary(energy_rollup.version)
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric(label="Today's Usage", 
+                          value=f"{summary['totals']['day']:.2f} kWh", 
+                          delta=f"{summary['deltas']['day']:.2f} kWh", delta_color="inverse")
+            with col2:
+                st.metric(label="This Week", 
+                          value=f"{summary['totals']['week']:.2f} kWh", 
+                          delta=f"{summary['deltas']['week']:.2f} kWh", delta_color="inverse")
+            with col3:
+                st.metric(label="This Month", 
+                          value=f"{summary['totals']['month']:.2f} kWh", 
+                          delta=f"{summary['deltas']['month']:.2f} kWh", delta_color="inverse")
+
+            # Chart the last 24 hourly totals
+            st.line_chart(summary['hourly'])
+
+            # Next day's HVAC and fan use from the thermal model, at the current settings
+            st.subheader("🔮 Next 24 Hours")
+            forecast = energy_forecast(home.climate.thermostat, home.climate.fan_speed,
+                                       tuple(home.lights[room] for room in thermal_model.rooms),
+                                       int(time.time() // FORECAST_INTERVAL))
+            st.metric(label="Heating, cooling and fan", value=f"{forecast['total']:.2f} kWh")
+            st.line_chart(forecast['hourly'])
+            if forecast['saving'] > 0:
+                thermostat_tip = (f"Reduce thermostat by 1°C to save about {forecast['saving']:.1f} kWh "
+                                  f"({forecast['saving'] / forecast['total']:.0%}) over the next day")
 
         # Energy saving recommendations
         st.subheader("💡 Energy Saving Recommendations")
         recommendations = [
             "Turn off lights in unoccupied rooms",
-            "Reduce thermostat by 1°C to save up to 10% on heating costs",
+            thermostat_tip,
             "Use appliances during off-peak hours (10pm-7am)",
             "Unplug devices not in use to eliminate standby power consumption"
         ]
-        for i, rec in enumerate(recommendations):
-            st.markdown(f"**{i+1}.** {rec}")
-        st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown("\n".join(f"**{i+1}.** {rec}  " for i, rec in enumerate(recommendations)))
 
     # Irrigation tab content
     elif st.session_state.current_tab == "Irrigation":
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.subheader("🌱 Irrigation System")
 
-        for zone, data in st.session_state.irrigation_zones.items():
-            zone_status = "Active" if data['active'] else "Inactive"
-            zone_color = "green" if data['active'] else "gray"
-            st.markdown(f"<div class='device-label'><b>{zone.replace('_', ' ').capitalize()}</b> <span style='color: {zone_color};'>{zone_status}</span></div>", unsafe_allow_html=True)
-            
-            zone_cols = st.columns([2, 1, 1])
-            with zone_cols[0]:
-                st.markdown(f"Schedule: {data['schedule']}, Duration: {data['duration']} min")
-            
-            with zone_cols[1]:
-                new_schedule = st.time_input(f"New time", label_visibility="collapsed", key=f"time_{zone}")
-                new_schedule_str = new_schedule.strftime("%I:%M %p")
-            
-            with zone_cols[2]:
-                new_duration = st.number_input(f"Duration (min)", min_value=5, max_value=60, 
-                                               value=data['duration'], step=5, 
-                                               label_visibility="collapsed", 
-                                               key=f"duration_{zone}")
-            
-            control_cols = st.columns([3, 1, 1])
-            with control_cols[0]:
-                st.markdown(f"<div style='height: 5px;'></div>", unsafe_allow_html=True)
-            
-            with control_cols[1]:
-                if st.button("Update Schedule", key=f"update_{zone}", use_container_width=True):
-                    update_irrigation_schedule(zone, new_schedule_str, new_duration)
-            
-            with control_cols[2]:
-                if st.button("Toggle", key=f"toggle_{zone}", use_container_width=True):
-                    toggle_irrigation(zone)
-            
-            st.markdown("<hr>", unsafe_allow_html=True)
+        irrigation_panel(target)
 
         # Weather forecast (simplified)
         st.subheader("☁️ Weather Forecast")
-        weather_data = [
-            {"day": "Today", "icon": "☀️", "temp": "24°C", "precip": "0%"},
-            {"day": "Tomorrow", "icon": "⛅", "temp": "22°C", "precip": "10%"},
-            {"day": "Day 3", "icon": "🌧️", "temp": "19°C", "precip": "60%"},
-        ]
-
-        weather_cols = st.columns(len(weather_data))
-        for i, day in enumerate(weather_data):
-            with weather_cols[i]:
-                st.markdown(f"<div style='text-align: center;'><h4>{day['day']}</h4><p style='font-size: 2rem; margin: 0;'>{day['icon']}</p><p>{day['temp']}</p><p>Precipitation: {day['precip']}</p></div>", unsafe_allow_html=True)
-        st.markdown("</div>", unsafe_allow_html=True)
+        st.markdown(render.weather_card(WEATHER_FORECAST, version=0), unsafe_allow_html=True)
 
     # IoT Devices tab content
     elif st.session_state.current_tab == "IoT Devices":
-        st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.subheader("🏠 Smart IoT Devices")
 
-        # Define IoT devices with their connection status and additional details
-        iot_devices = [
-            {
-                "name": "Smart Refrigerator",
-                "status": "Connected",
-                "details": "Temperature: 3°C, Door: Closed",
-                "icon": "❄️"
-            },
-            {
-                "name": "Smart Microwave",
-                "status": "Connected",
-                "details": "Last Used: 22:30, Mode: Standby",
-                "icon": "🍽️"
-            },
-            {
-                "name": "Smart Washing Machine",
-                "status": "Offline",
-                "details": "Last Cycle: Completed, Ready to Start",
-                "icon": "🧺"
-            },
-            {
-                "name": "Smart Dishwasher",
-                "status": "Connected",
-                "details": "Cycle: Drying, Remaining: 15 min",
-                "icon": "🍽️"
-            },
-            {
-                "name": "Smart Oven",
-                "status": "Connected",
-                "details": "Temperature: 180°C, Mode: Bake",
-                "icon": "🥘"
-            },
-            {
-                "name": "Smart Coffee Maker",
-                "status": "Offline",
-                "details": "Last Brew: Morning, Descaling Needed",
-                "icon": "☕"
-            }
-        ]
-
-        # Display IoT devices
-        for device in iot_devices:
-            # Determine status color
-            status_color = "green" if device["status"] == "Connected" else "red"
-            
-            # Create device card
-            st.markdown(f"""
-            <div class='wifi-network'>
-                <div>
-                    <b>{device['icon']} {device['name']}</b>
-                    <span style='color: {status_color}; margin-left: 10px;'>{device['status']}</span>
-                    <p style='color: gray; margin: 5px 0;'>{device['details']}</p>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-        
-        st.markdown("</div>", unsafe_allow_html=True)
-
-        st.markdown("</div>", unsafe_allow_html=True)
+        # Display the latest device snapshots, a page at a time
+        devices = device_cache.devices()
+        page = 1
+        if len(devices) > IOT_PAGE_SIZE:
+            page_count = -(-len(devices) // IOT_PAGE_SIZE)
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key="iot_page")
+        page_devices = devices[(page - 1) * IOT_PAGE_SIZE:page * IOT_PAGE_SIZE]
+        st.markdown(render.iot_devices_card(page_devices, version=(device_cache.version, page)), unsafe_allow_html=True)
+
+    # Fleet tab content
+    elif st.session_state.current_tab == "Fleet" and FLEET_SIZE:
+        fleet_panel()
+
+    # Metrics tab content, for admins only
+    elif st.session_state.current_tab == "Metrics" and is_admin():
+        metrics_panel()
+        baselines_panel()
+
+# Background thread advancing the simulated sensors, shared by every session
+@st.cache_resource
+def get_sensor_ticker():
+    ticker = PeriodicWorker("sensor-ticker", SENSOR_INTERVAL, update_sensors)
+    ticker.start()
+    return ticker
+
+# Background scheduler running irrigation zones at their set times, shared by every session.
+# Only this home's zones are scheduled at startup: fleet homes are simulated and only
+# loaded when opened, so their zones run when started by hand or once their schedule
+# is updated from the Irrigation tab.
+@st.cache_resource
+def get_irrigation_scheduler():
+    scheduler = IrrigationScheduler(irrigation_started, irrigation_stopped)
+    for zone, data in home.irrigation_zones.items():
+        scheduler.schedule((home.name, zone), data.schedule, data.duration)
+    scheduler.start()
+    return scheduler
+
+# Background thread writing the metrics to METRICS_FILE for Prometheus to pick up
+@st.cache_resource
+def get_metrics_exporter():
+    exporter = PeriodicWorker("metrics-exporter", METRICS_EXPORT_INTERVAL,
+                              lambda: metrics.registry.write_prometheus(METRICS_FILE))
+    exporter.start()
+    return exporter
+
+# Camera frames for the Security tab, captured by a background worker. Uses the
+# synthetic source until real feeds are wired in.
+@st.cache_resource
+def get_camera_pipeline():
+    pipeline = CameraPipeline(home.cameras.names, SyntheticSource(), enabled=lambda camera: home.cameras[camera])
+    PeriodicWorker("camera-capture", CAPTURE_INTERVAL, metrics.timed("camera_capture")(pipeline.capture)).start()
+    return pipeline
+
+# Queue coalescing commands from the high-frequency controls, shared by every session
+@st.cache_resource
+def get_command_queue():
+    queue = CommandQueue()
+    queue.start()
+    return queue
 
 # Main app logic
 def main():
-    # Check if user is logged in
-    if 'logged_in' not in st.session_state or not st.session_state.logged_in:
-        login_page()
+    get_sensor_ticker()
+    get_irrigation_scheduler()
+    if metrics.ENABLED:
+        get_metrics_exporter()
+
+    # Cards register themselves as they render (see card())
+    st.session_state.card_fragments = {}
+
+    # Check if user is logged in: a missing, forged or expired token shows the login page
+    st.session_state.username = get_authenticator().verify(st.session_state.auth_token)
+    if st.session_state.username is None:
+        with metrics.timer("rerun:Login"):
+            login_page()
+        watch_changes(home)
         return
 
-    # Render main dashboard
-    main_dashboard()
+    # Render main dashboard, timed per tab
+    with metrics.timer(f"rerun:{st.session_state.current_tab}"):
+        main_dashboard()
+    watch_changes(current_home())
 
 # Run the main app
 if __name__ == "__main__":
@@ -0,0 +1,182 @@
+import argparse
+import getpass
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# scrypt cost parameters for new password hashes (about 70 ms and 16 MB per hash)
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+# Password hashes computed at once; further logins wait their turn
+KDF_WORKERS = 2
+# Seconds a session token stays valid
+TOKEN_TTL = 12 * 3600
+# Login attempts allowed per user in a burst, and seconds until one more is allowed
+LOGIN_BURST = 5
+LOGIN_REFILL = 30.0
+# Most usernames whose attempts are tracked at once
+RATE_LIMIT_ENTRIES = 10000
+
+# Used when no users file exists: admin / password123
+DEFAULT_USERS = {
+    "admin": {"kdf": "scrypt", "n": 16384, "r": 8, "p": 1,
+              "salt": "23065dcc10910e12ea65a5cd4fdd1acc",
+              "hash": "312bb09cd54ce1fe93804f953d67a89ed71f4b8e28790d12460af79be6b00f4b"},
+}
+
+
+# Password hash for a users file record; `n` lowers the cost for throwaway test users
+def hash_password(password, n=SCRYPT_N):
+    salt = secrets.token_bytes(16)
+    derived = hashlib.scrypt(password.encode(), salt=salt, n=n, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+    return {"kdf": "scrypt", "n": n, "r": SCRYPT_R, "p": SCRYPT_P, "salt": salt.hex(), "hash": derived.hex()}
+
+
+def _derive(password, record):
+    salt = bytes.fromhex(record["salt"])
+    if record["kdf"] == "scrypt":
+        n, r = record["n"], record["r"]
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=record["p"],
+                              maxmem=256 * n * r, dklen=32)
+    if record["kdf"] == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, record["iterations"])
+    raise ValueError(f"Unknown password hash {record['kdf']!r}")
+
+
+# Token bucket per username: LOGIN_BURST attempts, then one more every LOGIN_REFILL
+# seconds. Rejected attempts never reach the password hash.
+class RateLimiter:
+    def __init__(self, burst=LOGIN_BURST, refill=LOGIN_REFILL, max_entries=RATE_LIMIT_ENTRIES, clock=time.monotonic):
+        self.burst = burst
+        self.refill = refill
+        self.max_entries = max_entries
+        self.clock = clock
+        # username -> (tokens, time they were counted), least recently used first
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    # Take one attempt for `key`; returns 0 if allowed, else seconds until the next one is
+    def acquire(self, key):
+        with self._lock:
+            now = self.clock()
+            tokens, counted = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - counted) / self.refill)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                return (1 - tokens) * self.refill
+            self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.max_entries:
+                self._buckets.popitem(last=False)
+            return 0
+
+    # Give `key` its full burst back, e.g. after a successful login
+    def reset(self, key):
+        with self._lock:
+            self._buckets.pop(key, None)
+
+
+# Result of Authenticator.login(): a session token, or why there is none
+class LoginResult:
+    __slots__ = ('token', 'retry_after')
+
+    def __init__(self, token=None, retry_after=0):
+        self.token = token
+        self.retry_after = retry_after
+
+
+# Checks passwords against a users file and issues session tokens. The users file
+# (JSON: username -> hash record from hash_password()) is read once, when the
+# authenticator is created. Password hashing is deliberately slow, so it runs on a
+# small thread pool: the logging-in session waits, other sessions' reruns don't, and
+# no more than KDF_WORKERS hashes run at once.
+#
+# Tokens are "username:expiry:signature" with an HMAC-SHA256 signature under a key
+# made when the process starts, so checking one on every rerun costs a single HMAC
+# and tokens die with the process, as sessions do.
+class Authenticator:
+    def __init__(self, users_file=None, ttl=TOKEN_TTL, limiter=None, clock=time.time):
+        self.users = self._load(users_file)
+        self.ttl = ttl
+        self.limiter = RateLimiter() if limiter is None else limiter
+        self.clock = clock
+        self._key = secrets.token_bytes(32)
+        self._pool = ThreadPoolExecutor(max_workers=KDF_WORKERS, thread_name_prefix="password-hash")
+        # Unknown users are checked against this so they take as long as known ones
+        self._dummy = next(iter(self.users.values()), DEFAULT_USERS["admin"])
+
+    @staticmethod
+    def _load(users_file):
+        if users_file is None or not os.path.exists(users_file):
+            return dict(DEFAULT_USERS)
+        with open(users_file) as f:
+            users = json.load(f)
+        logger.info("Loaded %d users from %s", len(users), users_file)
+        return users
+
+    def login(self, username, password):
+        retry_after = self.limiter.acquire(username)
+        if retry_after:
+            return LoginResult(retry_after=retry_after)
+        record = self.users.get(username)
+        derived = self._pool.submit(_derive, password, record or self._dummy).result()
+        if record is None or not hmac.compare_digest(derived, bytes.fromhex(record["hash"])):
+            return LoginResult()
+        self.limiter.reset(username)
+        return LoginResult(token=self.issue(username))
+
+    def issue(self, username):
+        payload = f"{username}:{int(self.clock()) + self.ttl}"
+        return f"{payload}:{self._sign(payload)}"
+
+    # Username a token was issued to, or None if it is forged, malformed or expired
+    def verify(self, token):
+        if not token:
+            return None
+        payload, _, signature = token.rpartition(":")
+        username, _, expires = payload.rpartition(":")
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        if int(expires) <= self.clock():
+            return None
+        return username
+
+    def _sign(self, payload):
+        return hmac.new(self._key, payload.encode(), hashlib.sha256).hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add a user to a users file, or change their password")
+    parser.add_argument("users_file")
+    parser.add_argument("username")
+    args = parser.parse_args()
+
+    users = {}
+    if os.path.exists(args.users_file):
+        with open(args.users_file) as f:
+            users = json.load(f)
+    action = "Updated" if args.username in users else "Added"
+    password = getpass.getpass(f"Password for {args.username}: ")
+    if password != getpass.getpass("Repeat password: "):
+        parser.error("passwords do not match")
+    users[args.username] = hash_password(password)
+
+    temp_path = args.users_file + ".tmp"
+    with open(temp_path, "w") as f:
+        os.chmod(temp_path, 0o600)
+        json.dump(users, f, indent=2)
+    os.replace(temp_path, args.users_file)
+    print(f"{action} {args.username} in {args.users_file}")
+
+
+if __name__ == "__main__":
+    main()
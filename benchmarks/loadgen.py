@@ -0,0 +1,467 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+import numpy as np
+import streamlit
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+TABS = ["Dashboard", "Security", "Energy", "Irrigation", "IoT Devices"]
+ROOMS = ["living", "kitchen", "bedroom"]
+DOORS = ["main", "back", "garage"]
+PASSWORD = "loadgen-password"
+# Seconds between samples of the server's RSS, threads and CPU time
+SAMPLE_INTERVAL = 0.5
+
+# Script runs that ended because a newer run replaced them, not because they finished
+_INTERRUPTED = ForwardMsg.FINISHED_EARLY_FOR_RERUN
+
+
+# RSS, thread count and CPU time of a process, read from /proc (Linux only)
+class ProcessStats:
+    def __init__(self, pid):
+        self.pid = pid
+        self._ticks = os.sysconf("SC_CLK_TCK")
+
+    def sample(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f)
+        with open(f"/proc/{self.pid}/stat") as f:
+            # Skip past the command name, which may contain spaces
+            stat = f.read().rsplit(")", 1)[1].split()
+        return {
+            "rss_mb": int(fields["VmRSS"].split()[0]) / 1024,
+            "threads": int(fields["Threads"]),
+            "cpu_s": (int(stat[11]) + int(stat[12])) / self._ticks,
+        }
+
+
+# One simulated browser tab. It speaks Streamlit's websocket protocol directly:
+# BackMsg rerun requests carrying widget state out, ForwardMsg deltas in. Widget
+# ids are learned from the deltas, by key (or by label for unkeyed widgets), along
+# with the fragment each widget sits in, so that using it re-runs just that fragment;
+# fragments with run_every are re-run on their interval as the browser would.
+#
+# Each rerun's latency is the time from sending the request to its script_finished.
+# Runs that finish while no rerun is waiting were started by the server (change feed
+# pushes) and are only counted.
+class Session:
+    def __init__(self, http, url, username, rng, timeout):
+        self.http = http
+        self.url = url
+        self.username = username
+        self.rng = rng
+        self.timeout = timeout
+        self.tab = "Dashboard"
+        self.thermostat = 22
+        self.widgets = {}
+        # widget id -> id of the fragment it was drawn in
+        self.widget_fragments = {}
+        # fragment id -> [interval, next due]
+        self.fragments = {}
+        self.latencies = []
+        # Error description -> count
+        self.errors = Counter()
+        self.timeouts = 0
+        self.pushes = 0
+        self._waiting = False
+        self._full_run = False
+        self._ws = None
+        self._finished = asyncio.Queue()
+        self._reader = None
+
+    async def connect(self):
+        self._ws = await self.http.ws_connect(f"{self.url}/_stcore/stream", protocols=("streamlit",), max_msg_size=0)
+        self._reader = asyncio.create_task(self._read())
+        await self.rerun("load")
+
+    async def close(self):
+        if self._ws is not None:
+            await self._ws.close()
+        if self._reader is not None:
+            await self._reader
+
+    async def login(self):
+        await self.set_value("login_username", "string_value", self.username)
+        await self.set_value("login_password", "string_value", PASSWORD)
+        await self.click("label:Login", kind="login")
+
+    async def click(self, widget, kind="rerun"):
+        await self.rerun(kind, [(widget, "trigger_value", True)])
+
+    async def set_value(self, widget, field, value, kind="rerun"):
+        await self.rerun(kind, [(widget, field, value)])
+
+    # Ask for a script run with the given (widget, field, value) changes, or for a run
+    # of one fragment, and wait for it to finish. Changes to widgets drawn inside a
+    # fragment re-run only that fragment, as in the browser.
+    async def rerun(self, kind, changes=(), fragment_id=""):
+        message = BackMsg()
+        client_state = message.rerun_script
+        for widget, field, value in changes:
+            widget_id = self.widgets.get(widget)
+            if widget_id is None:
+                self.errors[f"no widget {widget!r} on {self.tab}"] += 1
+                return
+            fragment_id = fragment_id or self.widget_fragments.get(widget_id, "")
+            state = client_state.widget_states.widgets.add()
+            state.id = widget_id
+            if field == "double_array_value":
+                state.double_array_value.data.append(value)
+            else:
+                setattr(state, field, value)
+        client_state.fragment_id = fragment_id
+
+        while not self._finished.empty():
+            self._finished.get_nowait()
+        started = time.perf_counter()
+        self._waiting = True
+        await self._ws.send_bytes(message.SerializeToString())
+        try:
+            status = await asyncio.wait_for(self._finished.get(), self.timeout)
+            while status == _INTERRUPTED:
+                status = await asyncio.wait_for(self._finished.get(), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return
+        finally:
+            self._waiting = False
+        if status is None:
+            raise ConnectionError("server closed the connection")
+        self.latencies.append((kind, time.monotonic(), time.perf_counter() - started))
+
+    # Run every fragment whose interval has passed; returns when the next one is due
+    async def run_fragments(self):
+        now = time.monotonic()
+        for fragment_id, schedule in list(self.fragments.items()):
+            if schedule[1] <= now:
+                schedule[1] = now + schedule[0]
+                await self.rerun("fragment", fragment_id=fragment_id)
+        return min((due for _, due in self.fragments.values()), default=now + 1.0)
+
+    async def _read(self):
+        async for ws_message in self._ws:
+            if ws_message.type != aiohttp.WSMsgType.BINARY:
+                continue
+            message = ForwardMsg()
+            message.ParseFromString(ws_message.data)
+            kind = message.WhichOneof("type")
+            if kind == "new_session":
+                # A full run re-registers its fragments; a fragment run leaves them be
+                self._full_run = not message.new_session.fragment_ids_this_run
+                if self._full_run:
+                    self.fragments.clear()
+            elif kind == "delta" and message.delta.WhichOneof("type") == "new_element":
+                self._learn(message.delta.new_element, message.delta.fragment_id)
+            elif kind == "auto_rerun":
+                interval = message.auto_rerun.interval
+                self.fragments[message.auto_rerun.fragment_id] = [interval, time.monotonic() + interval]
+            elif kind == "script_finished":
+                if self._waiting:
+                    self._finished.put_nowait(message.script_finished)
+                elif message.script_finished != _INTERRUPTED:
+                    self.pushes += 1
+            # ref_hash messages repeat elements the session has already seen in full
+        # Wake a rerun still waiting on the closed connection
+        self._finished.put_nowait(None)
+
+    def _learn(self, element, fragment_id):
+        element_type = element.WhichOneof("type")
+        if element_type == "exception":
+            self.errors[f"{element.exception.type}: {element.exception.message}"] += 1
+            return
+        widget = getattr(element, element_type)
+        widget_id = getattr(widget, "id", None)
+        if not widget_id:
+            return
+        key = widget_id.split("-", 2)[2]
+        # Only full runs tag deltas with their fragment
+        if self._full_run:
+            self.widget_fragments[widget_id] = fragment_id
+        self.widgets[f"label:{widget.label}" if key == "None" else key] = widget_id
+
+
+# The interactions a logged-in session performs
+
+async def switch_tab(session):
+    session.tab = session.rng.choice([tab for tab in TABS if tab != session.tab])
+    await session.click(f"tab_{session.tab}")
+
+
+async def open_tab(session, tab):
+    if session.tab != tab:
+        session.tab = tab
+        await session.click(f"tab_{tab}")
+
+
+async def toggle_light(session):
+    await open_tab(session, "Dashboard")
+    await session.click(f"light_{session.rng.choice(ROOMS)}")
+
+
+# A drag across a few values, each released slider position being one rerun
+async def drag_thermostat(session):
+    await open_tab(session, "Dashboard")
+    step = session.rng.choice((-1, 1))
+    for _ in range(session.rng.randint(2, 5)):
+        session.thermostat = min(max(session.thermostat + step, 16), 30)
+        await session.set_value("thermostat_slider", "double_array_value", float(session.thermostat))
+        await asyncio.sleep(0.2)
+
+
+async def set_fan(session):
+    await open_tab(session, "Dashboard")
+    await session.click(f"fan_{session.rng.randint(0, 3)}")
+
+
+async def use_door(session):
+    await open_tab(session, "Security")
+    await session.click(f"{session.rng.choice(('open', 'close'))}_{session.rng.choice(DOORS)}")
+
+
+async def idle(session):
+    pass
+
+
+# Interaction mix as (action, relative weight)
+ACTIONS = [
+    (switch_tab, 3),
+    (toggle_light, 2),
+    (drag_thermostat, 2),
+    (set_fan, 1),
+    (use_door, 1),
+    (idle, 1),
+]
+
+
+async def run_session(http, url, username, seed, delay, think, timeout, stop):
+    rng = random.Random(seed)
+    session = Session(http, url, username, rng, timeout)
+    actions, weights = zip(*ACTIONS)
+    await asyncio.sleep(delay)
+    try:
+        await session.connect()
+        await session.login()
+        next_action = time.monotonic() + rng.expovariate(1 / think)
+        while not stop.is_set():
+            next_fragment = await session.run_fragments()
+            if time.monotonic() >= next_action:
+                await rng.choices(actions, weights)[0](session)
+                next_action = time.monotonic() + rng.expovariate(1 / think)
+            wait = min(next_fragment, next_action) - time.monotonic()
+            if wait > 0:
+                try:
+                    await asyncio.wait_for(stop.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+    except Exception as exc:
+        session.errors[repr(exc)] += 1
+    finally:
+        await session.close()
+    return session
+
+
+def percentiles(values):
+    if not len(values):
+        return {"count": 0}
+    values = np.array(values) * 1000
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p95_ms": round(float(np.percentile(values, 95)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+# Run `sessions` sessions, started evenly over `ramp` seconds, and measure the
+# `duration` seconds after the ramp
+async def run_level(url, sessions, ramp, duration, think, timeout, stats):
+    stop = asyncio.Event()
+    samples = []
+    connector = aiohttp.TCPConnector(limit=0)
+    async with aiohttp.ClientSession(connector=connector) as http:
+        tasks = [asyncio.create_task(run_session(http, url, f"load{i:04d}", i, i * ramp / sessions,
+                                                 think, timeout, stop))
+                 for i in range(sessions)]
+        await asyncio.sleep(ramp)
+        window_start = time.monotonic()
+        client_start = sum(os.times()[:2])
+        while time.monotonic() - window_start < duration:
+            if stats is not None:
+                samples.append(stats.sample())
+            await asyncio.sleep(SAMPLE_INTERVAL)
+        if stats is not None:
+            samples.append(stats.sample())
+        window_end = time.monotonic()
+        client_cpu = sum(os.times()[:2]) - client_start
+        stop.set()
+        results = await asyncio.gather(*tasks)
+
+    elapsed = window_end - window_start
+    # Page loads and logins all happen during the ramp, so they are counted in full
+    by_kind = {"load": [], "login": [], "rerun": [], "fragment": []}
+    for session in results:
+        for kind, finished, latency in session.latencies:
+            if window_start <= finished <= window_end or kind in ("load", "login"):
+                by_kind[kind].append(latency)
+    level = {
+        "sessions": sessions,
+        "reruns_per_s": round(len(by_kind["rerun"]) / elapsed, 2),
+        "fragments_per_s": round(len(by_kind["fragment"]) / elapsed, 2),
+        "pushes": sum(session.pushes for session in results),
+        "rerun": percentiles(by_kind["rerun"]),
+        "fragment": percentiles(by_kind["fragment"]),
+        "load": percentiles(by_kind["load"]),
+        "login": percentiles(by_kind["login"]),
+        "errors": sum(sum(session.errors.values()) for session in results),
+        "error_kinds": dict(sum((session.errors for session in results), Counter()).most_common(5)),
+        "timeouts": sum(session.timeouts for session in results),
+        "client_cpu_percent": round(client_cpu / elapsed * 100, 1),
+    }
+    if len(samples) > 1:
+        level["rss_mb"] = round(max(sample["rss_mb"] for sample in samples), 1)
+        level["threads"] = max(sample["threads"] for sample in samples)
+        level["server_cpu_percent"] = round((samples[-1]["cpu_s"] - samples[0]["cpu_s"]) / elapsed * 100, 1)
+    return level
+
+
+# Users file with one user per session, so per-user login rate limits don't kick in
+def write_users(path, count, n=None):
+    from auth import hash_password
+
+    with ThreadPoolExecutor() as pool:
+        records = pool.map(lambda _: hash_password(PASSWORD) if n is None else hash_password(PASSWORD, n=n),
+                           range(count))
+        users = {f"load{i:04d}": record for i, record in enumerate(records)}
+    with open(path, "w") as f:
+        json.dump(users, f)
+
+
+# Launch `streamlit run app.py` and wait until it answers its health check
+def start_server(port, data_dir, users_file, timeout=60):
+    import urllib.request
+
+    env = dict(os.environ, SMART_HOME_DATA_DIR=data_dir, SMART_HOME_USERS=users_file)
+    log = open(os.path.join(data_dir, "server.log"), "wb")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+         "--server.port", str(port), "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with {server.returncode}; see {log.name}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1):
+                return server
+        except OSError:
+            time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError(f"server did not come up within {timeout} s; see {log.name}")
+
+
+def print_level(level):
+    rerun = level["rerun"]
+    print(f"{level['sessions']:>8}{level['reruns_per_s']:>10.1f}{rerun.get('p50_ms', 0):>10.0f}"
+          f"{rerun.get('p95_ms', 0):>10.0f}{rerun.get('p99_ms', 0):>10.0f}{level['fragment'].get('p95_ms', 0):>12.0f}"
+          f"{level.get('rss_mb', 0):>9.0f}{level.get('threads', 0):>9}{level.get('server_cpu_percent', 0):>8.0f}"
+          f"{level['errors'] + level['timeouts']:>8}")
+
+
+# Print each level's rerun p95 next to a previous result file's
+def compare(results, baseline):
+    old_levels = {level["sessions"]: level for level in baseline["levels"]}
+    print(f"\n{'sessions':>8}  {'reruns/s':<24}p95 ms")
+    for level in results["levels"]:
+        old = old_levels.get(level["sessions"])
+        if old is None or not old["rerun"]["count"] or not level["rerun"]["count"]:
+            print(f"{level['sessions']:>8}  (no baseline)")
+            continue
+        cells = []
+        for new_value, old_value in ((level["reruns_per_s"], old["reruns_per_s"]),
+                                     (level["rerun"]["p95_ms"], old["rerun"]["p95_ms"])):
+            change = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            cells.append(f"{old_value:.1f} -> {new_value:.1f} ({change:+.0f}%)")
+        print(f"{level['sessions']:>8}  {cells[0]:<24}{cells[1]:<26}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive a running app.py with many simulated sessions and "
+                                                 "record how rerun latency and server load grow")
+    parser.add_argument("--sessions", default="10,25,50,100,200",
+                        help="comma-separated session counts, one load level each")
+    parser.add_argument("--ramp", type=float, default=10.0, help="seconds over which a level's sessions start")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds measured per level, after the ramp")
+    parser.add_argument("--think", type=float, default=3.0, help="mean seconds between a session's interactions")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds before a rerun counts as timed out")
+    parser.add_argument("--slo-ms", type=float, default=500.0, help="rerun p95 above which a level is saturated")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--url", help="use an already running instance instead of launching one")
+    parser.add_argument("--pid", type=int, help="process to sample for RSS, threads and CPU with --url")
+    parser.add_argument("--kdf-n", type=int, help="scrypt cost of the generated users' passwords (default: auth.py's)")
+    parser.add_argument("--output", default="loadgen.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    levels = [int(count) for count in args.sessions.split(",")]
+    server = None
+    if args.url:
+        url, pid = args.url.rstrip("/"), args.pid
+    else:
+        data_dir = tempfile.mkdtemp(prefix="smart-home-load-")
+        users_file = os.path.join(data_dir, "users.json")
+        write_users(users_file, max(levels), args.kdf_n)
+        server = start_server(args.port, data_dir, users_file)
+        url, pid = f"http://127.0.0.1:{args.port}", server.pid
+    stats = ProcessStats(pid) if pid is not None and os.path.exists(f"/proc/{pid}") else None
+
+    results = {
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {"ramp": args.ramp, "duration": args.duration, "think": args.think, "kdf_n": args.kdf_n},
+        "levels": [],
+    }
+    print(f"{'sessions':>8}{'reruns/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'frag p95':>12}"
+          f"{'RSS MB':>9}{'threads':>9}{'CPU %':>8}{'errors':>8}")
+    try:
+        for sessions in levels:
+            level = asyncio.run(run_level(url, sessions, args.ramp, args.duration, args.think, args.timeout, stats))
+            results["levels"].append(level)
+            print_level(level)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    saturated = [level["sessions"] for level in results["levels"]
+                 if level["rerun"].get("p95_ms", float("inf")) > args.slo_ms or level["timeouts"]]
+    results["saturated_at"] = saturated[0] if saturated else None
+    print(f"\nrerun p95 exceeds {args.slo_ms:g} ms at "
+          f"{saturated[0] if saturated else 'none of the tested levels'} sessions")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+import streamlit
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+sys.path.insert(0, ROOT)
+
+from command_queue import CommandQueue
+
+TABS = ["Dashboard", "Security", "Energy", "Irrigation", "IoT Devices"]
+USERNAME = "admin"
+PASSWORD = "password123"
+
+
+# Fresh headless session logged in through login_page() and showing `tab`
+def logged_in_app(tab, timeout):
+    at = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    at.run()
+    at.text_input(key="login_username").input(USERNAME)
+    at.text_input(key="login_password").input(PASSWORD)
+    at.button[0].click().run()
+    if at.session_state.username is None:
+        raise RuntimeError("login failed")
+    at.button(key=f"tab_{tab}").click().run()
+    return at
+
+
+def rerun(at, i):
+    at.run()
+
+
+def switch_tabs(at, i):
+    at.button(key=f"tab_{TABS[i % len(TABS)]}").click().run()
+
+
+# Apply the control commands the app has queued (see command_queue.py), so timing a
+# control includes its state change, as it did before commands were coalesced.
+# AppTest runs the app in this process, so its queue is one of our threads.
+def flush_commands():
+    for thread in threading.enumerate():
+        if isinstance(thread, CommandQueue):
+            thread.flush()
+
+
+def toggle_light(at, i):
+    at.button(key="light_living").click().run()
+    flush_commands()
+
+
+def move_thermostat(at, i):
+    at.slider(key="thermostat_slider").set_value(20 + i % 5).run()
+    flush_commands()
+
+
+def arm_away(at):
+    at.button(key="arm_away").click().run()
+
+
+def open_close_door(at, i):
+    at.button(key="open_main" if i % 2 == 0 else "close_main").click().run()
+
+
+# Scenarios as (name, starting tab, setup or None, timed interaction)
+SCENARIOS = [(f"rerun:{tab}", tab, None, rerun) for tab in TABS] + [
+    ("switch_tabs", "Dashboard", None, switch_tabs),
+    ("toggle_light", "Dashboard", None, toggle_light),
+    ("thermostat_slider", "Dashboard", None, move_thermostat),
+    ("door_open_armed", "Security", arm_away, open_close_door),
+]
+
+
+# Number of rendered elements of each type below `node`
+def element_counts(node, counts=None):
+    counts = Counter() if counts is None else counts
+    children = getattr(node, "children", None)
+    if children:
+        for child in children.values():
+            element_counts(child, counts)
+    else:
+        counts[node.type] += 1
+    return counts
+
+
+def check(at, name):
+    if at.exception:
+        raise RuntimeError(f"{name}: {at.exception[0].value}")
+
+
+def run_scenario(name, tab, setup, action, runs, warmup, alloc_runs, timeout):
+    at = logged_in_app(tab, timeout)
+    if setup is not None:
+        setup(at)
+    for i in range(warmup):
+        action(at, i)
+    check(at, name)
+
+    times = []
+    for i in range(runs):
+        started = time.perf_counter()
+        action(at, i)
+        times.append(time.perf_counter() - started)
+        check(at, name)
+
+    # Allocation pass, kept apart from the timed runs since tracing slows them down
+    peaks = []
+    net = []
+    tracemalloc.start()
+    try:
+        for i in range(alloc_runs):
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            action(at, i)
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            net.append(current - before)
+    finally:
+        tracemalloc.stop()
+
+    counts = element_counts(at.main)
+    times = np.array(times) * 1000
+    return {
+        "runs": runs,
+        "p50_ms": round(float(np.percentile(times, 50)), 3),
+        "p95_ms": round(float(np.percentile(times, 95)), 3),
+        "p99_ms": round(float(np.percentile(times, 99)), 3),
+        "mean_ms": round(float(times.mean()), 3),
+        "alloc_peak_kib": round(float(np.median(peaks)) / 1024, 1) if peaks else None,
+        "alloc_net_kib": round(float(np.median(net)) / 1024, 1) if net else None,
+        "elements": sum(counts.values()),
+        "element_types": dict(sorted(counts.items())),
+    }
+
+
+# Print each scenario's latency next to a previous result file's
+def compare(results, baseline):
+    print(f"\n{'scenario':<22}{'p50 ms':>16}{'p95 ms':>16}{'elements':>12}")
+    for name, result in results["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            print(f"{name:<22}{'(new)':>16}")
+            continue
+        cells = []
+        for field in ("p50_ms", "p95_ms"):
+            change = (result[field] - old[field]) / old[field] * 100 if old[field] else 0.0
+            cells.append(f"{result[field]:.1f} ({change:+.0f}%)")
+        print(f"{name:<22}{cells[0]:>16}{cells[1]:>16}{old['elements']:>5} -> {result['elements']:<5}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app.py rerun latency, allocations and element counts with AppTest")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--alloc-runs", type=int, default=5, help="reruns measured under tracemalloc")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds allowed per rerun")
+    parser.add_argument("--scenario", action="append", help="only run scenarios whose name starts with this")
+    parser.add_argument("--output", default="rerun_bench.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    args = parser.parse_args()
+
+    # Keep the activity log out of the working tree
+    os.environ.setdefault("SMART_HOME_DATA_DIR", tempfile.mkdtemp(prefix="smart-home-bench-"))
+
+    results = {
+        "python": platform.python_version(),
+        "streamlit": streamlit.__version__,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "scenarios": {},
+    }
+    for name, tab, setup, action in SCENARIOS:
+        if args.scenario and not any(name.startswith(prefix) for prefix in args.scenario):
+            continue
+        result = run_scenario(name, tab, setup, action, args.runs, args.warmup, args.alloc_runs, args.timeout)
+        results["scenarios"][name] = result
+        print(f"{name:<22} p50 {result['p50_ms']:8.1f}  p95 {result['p95_ms']:8.1f}  p99 {result['p99_ms']:8.1f} ms"
+              f"  alloc {result['alloc_peak_kib']} KiB  elements {result['elements']}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=1)
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import argparse
+import io
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Size of a full camera frame (height, width, channels)
+FRAME_SHAPE = (360, 480, 3)
+# Thumbnails keep every THUMBNAIL_STEP-th pixel in each direction
+THUMBNAIL_STEP = 3
+THUMBNAIL_QUALITY = 70
+# Seconds between captures
+CAPTURE_INTERVAL = 0.5
+# Cameras nobody has looked at for this many seconds are not captured
+VIEWER_TIMEOUT = 5.0
+
+
+# Latest thumbnail of a camera, JPEG-encoded once and shared by every viewer
+class Frame:
+    __slots__ = ('seq', 'timestamp', 'jpeg')
+
+    def __init__(self, seq, timestamp, jpeg):
+        self.seq = seq
+        self.timestamp = timestamp
+        self.jpeg = jpeg
+
+
+# Stand-in frame source: a fixed per-camera pattern with a square moving across it.
+# Frames are drawn straight into the caller's buffer. A real source implements the
+# same read_into(camera, out, timestamp) and returns False when there is no new frame.
+class SyntheticSource:
+    def __init__(self, shape=FRAME_SHAPE):
+        self.shape = shape
+        self._patterns = {}
+
+    def read_into(self, camera, out, timestamp):
+        pattern = self._patterns.get(camera)
+        if pattern is None:
+            pattern = self._patterns[camera] = self._pattern(camera)
+        np.copyto(out, pattern)
+        height, width, _ = self.shape
+        size = height // 6
+        x = int(timestamp * 40) % (width - size)
+        y = int(timestamp * 25) % (height - size)
+        out[y:y + size, x:x + size] = 255
+        return True
+
+    def _pattern(self, camera):
+        rng = np.random.default_rng(zlib.crc32(camera.encode()))
+        height, width, channels = self.shape
+        tint = rng.integers(60, 180, channels)
+        rows = np.linspace(0.6, 1.0, height)[:, None, None]
+        noise = rng.integers(0, 24, (height, width, 1))
+        return np.clip(rows * tint + noise, 0, 255).astype(np.uint8)
+
+
+# Keeps the latest frame of every camera for the Security tab. A background worker
+# calls capture(), which reads each camera into its own preallocated buffer, takes a
+# thumbnail into a second preallocated buffer and encodes it to JPEG once. Viewers
+# only fetch the encoded bytes with latest(), so the cost per frame does not grow
+# with the number of sessions watching.
+#
+# Cameras for which `enabled(camera)` is false, or that no session has asked for
+# within VIEWER_TIMEOUT seconds, are skipped without reading a frame.
+class CameraPipeline:
+    def __init__(self, cameras, source, enabled, shape=FRAME_SHAPE, step=THUMBNAIL_STEP,
+                 quality=THUMBNAIL_QUALITY, clock=time.time):
+        height, width, channels = shape
+        self.source = source
+        self.enabled = enabled
+        self.step = step
+        self.quality = quality
+        self.clock = clock
+        self.captured = 0
+        self._frames = {camera: np.zeros(shape, np.uint8) for camera in cameras}
+        self._thumbnails = {camera: np.zeros((-(-height // step), -(-width // step), channels), np.uint8)
+                            for camera in cameras}
+        self._latest = {}
+        self._viewed = {}
+        self._lock = threading.Lock()
+
+    # Latest frame of `camera`, or None before the first capture. Also marks the
+    # camera as watched so the next captures include it.
+    def latest(self, camera):
+        self._viewed[camera] = self.clock()
+        return self._latest.get(camera)
+
+    def capture(self):
+        from PIL import Image
+
+        with self._lock:
+            now = self.clock()
+            for camera, frame in self._frames.items():
+                if not self.enabled(camera):
+                    self._latest.pop(camera, None)
+                    continue
+                if now - self._viewed.get(camera, -VIEWER_TIMEOUT) > VIEWER_TIMEOUT:
+                    continue
+                if not self.source.read_into(camera, frame, now):
+                    continue
+                thumbnail = self._thumbnails[camera]
+                np.copyto(thumbnail, frame[::self.step, ::self.step])
+                buffer = io.BytesIO()
+                Image.fromarray(thumbnail).save(buffer, format="JPEG", quality=self.quality)
+                self.captured += 1
+                self._latest[camera] = Frame(self.captured, now, buffer.getvalue())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the camera pipeline against synthetic cameras")
+    parser.add_argument("--cameras", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--interval", type=float, default=CAPTURE_INTERVAL)
+    args = parser.parse_args()
+
+    cameras = [f"camera_{i}" for i in range(args.cameras)]
+    pipeline = CameraPipeline(cameras, SyntheticSource(), enabled=lambda camera: True)
+    capture_times = []
+    deadline = time.perf_counter()
+    for _ in range(int(args.seconds / args.interval)):
+        for camera in cameras:
+            pipeline.latest(camera)
+        started = time.perf_counter()
+        pipeline.capture()
+        capture_times.append(time.perf_counter() - started)
+        deadline += args.interval
+        time.sleep(max(0.0, deadline - time.perf_counter()))
+
+    capture_times = np.array(capture_times) * 1000
+    sizes = [len(pipeline.latest(camera).jpeg) for camera in cameras]
+    print(f"{args.cameras} cameras, {len(capture_times)} captures, {pipeline.captured} frames, "
+          f"thumbnail {sum(sizes) // len(sizes)} bytes")
+    print(f"capture ms: mean {capture_times.mean():.3f}  p95 {np.percentile(capture_times, 95):.3f}  "
+          f"max {capture_times.max():.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds changes are gathered before subscribers are woken, so a burst of
+# mutations wakes each subscriber once
+DISPATCH_DELAY = 0.1
+
+
+# Broadcasts home state changes to subscribers. Homes attached with attach() report
+# which (home name, section) each mutation touched, and touch() reports other keys
+# (e.g. the activity log); subscribers register the keys they display and a wake()
+# callback. A dispatcher thread batches changes and calls each subscriber's
+# wake(changed) once per batch that touches one of its keys, with those keys, so a
+# subscriber showing nothing that changed costs nothing. No history of the changes
+# is kept: subscribers re-render what changed from the current state.
+#
+# wake() returns False once the subscriber is gone, which unsubscribes it. Changes
+# made by ops in `quiet_ops` (e.g. streaming sensor readings) are dropped and never
+# wake anyone.
+class ChangeFeed:
+    def __init__(self, delay=DISPATCH_DELAY, quiet_ops=()):
+        self.delay = delay
+        self.quiet_ops = frozenset(quiet_ops)
+        self._subscribers = {}
+        self._pending = set()
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._dispatch, name="change-feed", daemon=True)
+        self._thread.start()
+
+    def attach(self, home):
+        home.subscribe(self.publish)
+
+    # HomeState listener; runs with the mutated section's lock held, so only records
+    def publish(self, home, version, section, op, args):
+        if op in self.quiet_ops:
+            return
+        self.touch((home.name, section))
+
+    # Mark `key` changed: publish() does for home mutations, callers for other changes
+    def touch(self, key):
+        with self._condition:
+            self._pending.add(key)
+            self._condition.notify()
+
+    # Register (or replace) `subscriber`'s keys and wake callback
+    def subscribe(self, subscriber, keys, wake):
+        with self._condition:
+            self._subscribers[subscriber] = (frozenset(keys), wake)
+
+    def unsubscribe(self, subscriber):
+        with self._condition:
+            self._subscribers.pop(subscriber, None)
+
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+            # Let the rest of a burst arrive before waking anyone
+            time.sleep(self.delay)
+            with self._condition:
+                changed = self._pending
+                self._pending = set()
+                woken = [(subscriber, wake, keys & changed) for subscriber, (keys, wake) in self._subscribers.items()
+                         if not keys.isdisjoint(changed)]
+            for subscriber, wake, keys in woken:
+                try:
+                    alive = wake(keys)
+                except Exception:
+                    logger.exception("Waking %s failed", subscriber)
+                    alive = False
+                if not alive:
+                    self.unsubscribe(subscriber)
@@ -0,0 +1,95 @@
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds of quiet after the last command to an entity before it is applied
+COALESCE_WINDOW = 0.5
+# Longest a command is held back while new ones keep arriving
+MAX_DELAY = 2.0
+
+
+class _Pending:
+    __slots__ = ('value', 'apply', 'due', 'deadline')
+
+    def __init__(self, value, apply, due, deadline):
+        self.value = value
+        self.apply = apply
+        self.due = due
+        self.deadline = deadline
+
+
+# Sits between UI callbacks and the state mutators. Commands carry the target value
+# for an entity (the thermostat, a light); a burst of commands to the same entity
+# is coalesced into the last one and applied once, from a background thread, after
+# `window` seconds without a new command or `max_delay` seconds at most. A slider
+# drag across ten values therefore makes one state change, one activity entry and
+# one alert check instead of ten.
+class CommandQueue(threading.Thread):
+    def __init__(self, window=COALESCE_WINDOW, max_delay=MAX_DELAY, clock=time.monotonic):
+        super().__init__(name="command-queue", daemon=True)
+        self.window = window
+        self.max_delay = max_delay
+        self.clock = clock
+        self._pending = {}
+        self._stopped = False
+        self._wakeup = threading.Condition()
+        # Apply whatever is still queued when the process exits
+        atexit.register(self.shutdown)
+
+    # Queue `apply(value)` for `entity`, replacing any command still pending for it
+    def submit(self, entity, value, apply):
+        with self._wakeup:
+            now = self.clock()
+            pending = self._pending.get(entity)
+            if pending is None:
+                self._pending[entity] = _Pending(value, apply, now + self.window, now + self.max_delay)
+                self._wakeup.notify()
+            else:
+                pending.value = value
+                pending.apply = apply
+                pending.due = min(now + self.window, pending.deadline)
+
+    # Value waiting to be applied to `entity`, so the UI can show it straight away
+    def pending(self, entity, default=None):
+        pending = self._pending.get(entity)
+        return default if pending is None else pending.value
+
+    # Apply every pending command now
+    def flush(self):
+        with self._wakeup:
+            due = list(self._pending.items())
+            self._pending.clear()
+        for entity, pending in due:
+            self._apply(entity, pending)
+
+    def shutdown(self):
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify()
+        self.flush()
+
+    def run(self):
+        while True:
+            with self._wakeup:
+                while not self._stopped:
+                    now = self.clock()
+                    due = [entity for entity, pending in self._pending.items() if pending.due <= now]
+                    if due:
+                        break
+                    next_due = min((pending.due for pending in self._pending.values()), default=None)
+                    self._wakeup.wait(None if next_due is None else next_due - now)
+                if self._stopped:
+                    return
+                batch = [(entity, self._pending.pop(entity)) for entity in due]
+            # Apply outside the lock so new commands aren't held up by the mutators
+            for entity, pending in batch:
+                self._apply(entity, pending)
+
+    def _apply(self, entity, pending):
+        try:
+            pending.apply(pending.value)
+        except Exception:
+            logger.exception("Applying command for %s failed", entity)
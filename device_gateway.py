@@ -0,0 +1,128 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Seconds between polls of each device
+POLL_INTERVAL = 5.0
+# Seconds to wait for one device before marking it offline
+DEVICE_TIMEOUT = 2.0
+# Maximum number of requests in flight at once
+MAX_CONCURRENCY = 64
+# Seconds an idle pooled connection is kept open
+KEEPALIVE_TIMEOUT = 30.0
+
+
+# Latest known state of every device. The gateway publishes into it from its own
+# thread; the IoT Devices tab only reads, so rendering never waits on the network.
+class DeviceSnapshotCache:
+    def __init__(self, devices=()):
+        self.version = 0
+        self._snapshots = {}
+        self._lock = threading.Lock()
+        for device in devices:
+            self.publish(device)
+
+    # Store a snapshot (a dict with name, icon, status and details); the version only
+    # changes when the snapshot differs from the one already held
+    def publish(self, snapshot):
+        with self._lock:
+            if self._snapshots.get(snapshot["name"]) != snapshot:
+                self._snapshots[snapshot["name"]] = snapshot
+                self.version += 1
+
+    def devices(self):
+        with self._lock:
+            return list(self._snapshots.values())
+
+    def __len__(self):
+        return len(self._snapshots)
+
+
+# Polls device endpoints concurrently on a background asyncio event loop. Requests
+# share one pooled, keep-alive connector, each device has its own timeout, and a
+# semaphore caps how many polls are in flight. Results go to a DeviceSnapshotCache.
+#
+# Each device is a dict with name, icon, url and an optional timeout. A device answers GET url with JSON
+# {"status": ..., "details": ...}; any error, timeout or other reply marks it
+# Offline and keeps the last reported details.
+class DeviceGateway:
+    def __init__(self, devices, cache, interval=POLL_INTERVAL, timeout=DEVICE_TIMEOUT,
+                 concurrency=MAX_CONCURRENCY):
+        self.devices = list(devices)
+        self.cache = cache
+        self.interval = interval
+        self.timeout = timeout
+        self.concurrency = concurrency
+        self.last_cycle = None
+        self._last_details = {device["name"]: device.get("details", "") for device in self.devices}
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="device-gateway", daemon=True)
+        self._task = None
+
+    def start(self):
+        self._thread.start()
+        self._task = asyncio.run_coroutine_threadsafe(self._run(), self._loop)
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop.close()
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    # aiohttp is imported here rather than at module level so the app only pays for
+    # it when a gateway is actually configured
+    async def _run(self):
+        import aiohttp
+        connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=KEEPALIVE_TIMEOUT)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            while True:
+                started = time.monotonic()
+                results = await asyncio.gather(*(self._poll(session, semaphore, device) for device in self.devices),
+                                               return_exceptions=True)
+                for device, result in zip(self.devices, results):
+                    if isinstance(result, Exception):
+                        logger.error("Polling %s failed", device["name"], exc_info=result)
+                self.last_cycle = time.monotonic() - started
+                await asyncio.sleep(max(0.0, self.interval - self.last_cycle))
+
+    async def _poll(self, session, semaphore, device):
+        import aiohttp
+        async with semaphore:
+            try:
+                async with session.get(device["url"], timeout=aiohttp.ClientTimeout(total=device.get("timeout", self.timeout))) as response:
+                    response.raise_for_status()
+                    data = await response.json()
+                if not isinstance(data, dict):
+                    raise ValueError(f"expected a JSON object, got {type(data).__name__}")
+                status = str(data.get("status", "Connected"))
+                details = str(data.get("details", ""))
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as exc:
+                logger.debug("Polling %s failed: %r", device["name"], exc)
+                status = "Offline"
+                details = self._last_details[device["name"]]
+            except Exception:
+                logger.exception("Polling %s failed", device["name"])
+                status = "Offline"
+                details = self._last_details[device["name"]]
+            self._last_details[device["name"]] = details
+            self.cache.publish({"name": device["name"], "icon": device.get("icon", "🔌"),
+                                "status": status, "details": details})
+
+
+# Read a device list from a JSON file: a list of {"name", "icon", "url"} objects
+def load_devices(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
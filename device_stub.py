@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import json
+import random
+
+from aiohttp import web
+
+# Device kinds served by the stand-in, with a generator for their details line
+DEVICE_KINDS = [
+    ("Smart Refrigerator", "❄️", lambda: f"Temperature: {random.randint(2, 5)}°C, Door: {random.choice(['Closed', 'Open'])}"),
+    ("Smart Microwave", "🍽️", lambda: f"Mode: {random.choice(['Standby', 'Heating', 'Defrost'])}"),
+    ("Smart Washing Machine", "🧺", lambda: f"Cycle: {random.choice(['Idle', 'Washing', 'Spinning'])}"),
+    ("Smart Dishwasher", "🍽️", lambda: f"Cycle: Drying, Remaining: {random.randint(1, 60)} min"),
+    ("Smart Oven", "🥘", lambda: f"Temperature: {random.choice([0, 160, 180, 200])}°C, Mode: Bake"),
+    ("Smart Coffee Maker", "☕", lambda: f"Water level: {random.randint(0, 100)}%"),
+]
+
+
+# Local stand-in for real appliances: serves GET /devices/<n> for n in [0, count)
+# with optional added latency and a share of failing devices
+def make_app(count, latency=0.0, failure_rate=0.0):
+    async def device(request):
+        index = int(request.match_info["index"])
+        if index >= count:
+            raise web.HTTPNotFound()
+        if latency:
+            await asyncio.sleep(random.uniform(0, 2 * latency))
+        if random.random() < failure_rate:
+            raise web.HTTPServiceUnavailable()
+        details = DEVICE_KINDS[index % len(DEVICE_KINDS)][2]()
+        return web.json_response({"status": "Connected", "details": details})
+
+    app = web.Application()
+    app.router.add_get("/devices/{index}", device)
+    return app
+
+
+# Device list for the gateway pointing at a stand-in server
+def device_config(count, host, port):
+    devices = []
+    for index in range(count):
+        name, icon, _ = DEVICE_KINDS[index % len(DEVICE_KINDS)]
+        devices.append({"name": f"{name} #{index}", "icon": icon, "url": f"http://{host}:{port}/devices/{index}"})
+    return devices
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stand-in IoT devices for the device gateway")
+    parser.add_argument("--devices", type=int, default=6)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="mean response delay in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.02)
+    parser.add_argument("--write-config", metavar="PATH", help="write the matching device list for SMART_HOME_DEVICES")
+    args = parser.parse_args()
+
+    if args.write_config:
+        with open(args.write_config, "w", encoding="utf-8") as f:
+            json.dump(device_config(args.devices, args.host, args.port), f, ensure_ascii=False, indent=1)
+    web.run_app(make_app(args.devices, args.latency, args.failure_rate), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
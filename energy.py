@@ -0,0 +1,177 @@
+import threading
+from collections import deque
+from itertools import islice
+from datetime import datetime, timedelta
+
+# Typical draw of each metered device, in kW
+BASE_LOAD_KW = 0.35
+LIGHT_KW = 0.06
+FAN_KW_PER_LEVEL = 0.025
+HEATING_MAX_KW = 2.0
+
+# Longest gap between power readings that is integrated into energy, in seconds
+MAX_SAMPLE_GAP = 60
+
+# Completed buckets kept per period
+HISTORY = {'hour': 24 * 35, 'day': 400, 'week': 60, 'month': 24}
+
+
+# Start of the bucket containing `moment`, and the start of the next one
+def bucket_bounds(period, moment):
+    if period == 'hour':
+        start = moment.replace(minute=0, second=0, microsecond=0)
+        return start, start + timedelta(hours=1)
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'day':
+        return start, start + timedelta(days=1)
+    if period == 'week':
+        start -= timedelta(days=start.weekday())
+        return start, start + timedelta(weeks=1)
+    start = start.replace(day=1)
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+
+# Running total for the open bucket of one period
+class _Bucket:
+    __slots__ = ('start', 'end', 'total', 'devices')
+
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+        self.total = 0.0
+        self.devices = {}
+
+
+# Incremental hour/day/week/month energy rollups. Each sample adds to the open bucket
+# of every period; a bucket is moved into a bounded history only when a sample
+# lands past its end, so ingest is O(1) and nothing is ever rescanned. Late samples
+# are counted in the open bucket.
+class EnergyRollup:
+    PERIODS = ('hour', 'day', 'week', 'month')
+
+    def __init__(self):
+        self.version = 0
+        self._last_reading = None
+        self._open = {}
+        self._history = {period: deque(maxlen=HISTORY[period]) for period in self.PERIODS}
+        self._lock = threading.Lock()
+
+    # Record `kwh` consumed by `device`, ending at `timestamp` (seconds since epoch)
+    def ingest(self, device, timestamp, kwh):
+        with self._lock:
+            moment = None
+            for period in self.PERIODS:
+                bucket = self._open.get(period)
+                if bucket is None or timestamp >= bucket.end:
+                    moment = moment or datetime.fromtimestamp(timestamp)
+                    bucket = self._roll(period, moment)
+                bucket.total += kwh
+                bucket.devices[device] = bucket.devices.get(device, 0.0) + kwh
+            self.version += 1
+
+    # Record a reading of each device's instantaneous draw in kW, integrating it over
+    # the time since the previous reading (capped at MAX_SAMPLE_GAP)
+    def ingest_power(self, readings, timestamp):
+        last, self._last_reading = self._last_reading, timestamp
+        if last is None:
+            return
+        hours = min(max(timestamp - last, 0), MAX_SAMPLE_GAP) / 3600
+        for device, kw in readings.items():
+            self.ingest(device, timestamp, kw * hours)
+
+    def _roll(self, period, moment):
+        bucket = self._open.get(period)
+        if bucket is not None:
+            self._history[period].append((bucket.start, bucket.total))
+        start, end = bucket_bounds(period, moment)
+        bucket = self._open[period] = _Bucket(start.timestamp(), end.timestamp())
+        return bucket
+
+    # Open buckets and history as plain data, for the state snapshot (see persistence.py)
+    def to_snapshot(self):
+        with self._lock:
+            return {
+                'open': {period: (bucket.start, bucket.end, bucket.total, dict(bucket.devices))
+                         for period, bucket in self._open.items()},
+                'history': {period: list(history) for period, history in self._history.items()},
+            }
+
+    # Load a to_snapshot() result. The last reading time is not restored, so the
+    # time the process was down is not metered.
+    def restore(self, snapshot):
+        with self._lock:
+            self._open = {}
+            for period, (start, end, total, devices) in snapshot['open'].items():
+                bucket = self._open[period] = _Bucket(start, end)
+                bucket.total = total
+                bucket.devices = dict(devices)
+            for period, history in snapshot['history'].items():
+                if period in self._history:
+                    self._history[period].clear()
+                    self._history[period].extend(history)
+            self.version += 1
+
+    # Total of the open bucket for `period`
+    def current(self, period):
+        bucket = self._open.get(period)
+        return bucket.total if bucket is not None else 0.0
+
+    # Per-device totals of the open bucket for `period`
+    def devices(self, period):
+        bucket = self._open.get(period)
+        return dict(bucket.devices) if bucket is not None else {}
+
+    # The last `count` buckets of `period`, oldest first, as (start, total) pairs;
+    # the open bucket is included and missing buckets are reported as zero
+    def series(self, period, count, now=None):
+        with self._lock:
+            totals = dict(islice(reversed(self._history[period]), count))
+            bucket = self._open.get(period)
+            if bucket is not None:
+                totals[bucket.start] = bucket.total
+        moment = datetime.fromtimestamp(now) if now is not None else datetime.now()
+        starts = []
+        for _ in range(count):
+            start, _ = bucket_bounds(period, moment)
+            starts.append(start.timestamp())
+            moment = start - timedelta(seconds=1)
+        return [(start, totals.get(start, 0.0)) for start in reversed(starts)]
+
+    # Usage in the previous `period` up to the same point in that period as `now`,
+    # summed from the finer-grained history
+    def previous_to_date(self, period, now):
+        fine = 'hour' if period == 'day' else 'day'
+        current_start, _ = bucket_bounds(period, datetime.fromtimestamp(now))
+        previous_start, _ = bucket_bounds(period, current_start - timedelta(seconds=1))
+        cutoff = previous_start + (datetime.fromtimestamp(now) - current_start)
+        lo, hi = previous_start.timestamp(), cutoff.timestamp()
+        total = 0.0
+        with self._lock:
+            for start, bucket_total in reversed(self._history[fine]):
+                if start < lo:
+                    break
+                if start < hi:
+                    total += bucket_total
+        return total
+
+    # Totals for the Energy tab: each period's usage so far and its change against
+    # the same point of the previous period, plus the last 24 hourly totals
+    def summary(self, now):
+        return {
+            'totals': {period: self.current(period) for period in ('day', 'week', 'month')},
+            'deltas': {period: self.current(period) - self.previous_to_date(period, now)
+                       for period in ('day', 'week', 'month')},
+            'hourly': self.series('hour', 24, now)
+        }
+
+
+# Instantaneous draw of each device in the home, in kW, with the HVAC's draw taken
+# from the thermal model (see thermal.py)
+def home_power(home, hvac_kw):
+    lights_on = sum(1 for _, is_on in home.lights.items() if is_on)
+    return {
+        'base_load': BASE_LOAD_KW,
+        'lights': lights_on * LIGHT_KW,
+        'fan': home.climate.fan_speed * FAN_KW_PER_LEVEL,
+        'hvac': hvac_kw
+    }
@@ -0,0 +1,51 @@
+import numpy as np
+
+
+# Maps the entities of batched readings to columns of per-entity state arrays, as
+# used by the alert rules and the anomaly detector. Named entities are mapped to
+# columns on first sight; integer entities index directly. `size` is the number of
+# columns the state arrays have, doubled whenever a batch needs more.
+class EntityColumns:
+    __slots__ = ('keys', 'index', 'size')
+
+    def __init__(self):
+        self.keys = None
+        self.index = {}
+        self.size = 0
+
+    # Columns for a batch of entities: a plain slice for integer entities, an index
+    # array for named ones. Also returns the new size when the state arrays must grow
+    # (see grow()), else None.
+    def columns(self, entities, count):
+        if entities is None:
+            columns = slice(0, count)
+            needed = count
+        else:
+            if self.keys is None:
+                self.keys = []
+            for entity in entities:
+                if entity not in self.index:
+                    self.index[entity] = len(self.keys)
+                    self.keys.append(entity)
+            columns = np.fromiter((self.index[entity] for entity in entities), dtype=np.intp, count=count)
+            needed = int(columns.max()) + 1
+        if needed <= self.size:
+            return columns, None
+        self.size = max(needed, 2 * self.size)
+        return columns, self.size
+
+    # Column of `entity`, or None if it has none yet
+    def column(self, entity):
+        if self.keys is None and isinstance(entity, int):
+            return entity if entity < self.size else None
+        return self.index.get(entity)
+
+    # Entity of `column`
+    def entity(self, column):
+        return self.keys[column] if self.keys is not None else column
+
+
+# `array` with its last axis padded with `fill` to `size` columns
+def grow(array, size, fill=0):
+    pad = [(0, 0)] * (array.ndim - 1) + [(0, size - array.shape[-1])]
+    return np.pad(array, pad, constant_values=fill)
@@ -0,0 +1,155 @@
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from home_state import HomeState
+
+# Status columns the fleet can be filtered on, with their display labels
+STATUSES = {
+    'armed': "Armed",
+    'door_open': "Door open",
+    'camera_off': "Camera off",
+    'alert_active': "Alert active",
+}
+SECURITY_STATES = ('disarmed', 'armed_home', 'armed_away')
+
+_DOOR_ALERT = "Security alert: {} door opened while system armed!"
+
+
+# Device state of every home in the fleet, held column-wise in NumPy arrays (one row
+# per home, one column per device for lights, cameras and doors) rather than as one
+# HomeState per home.
+#
+# Each status in STATUSES has a boolean index column that is kept up to date on every
+# change, so a filter such as "armed with a door open" is a few vectorized ANDs over
+# the index columns: well under a millisecond for 50k homes.
+#
+# home(i) materializes a single home as a HomeState for the dashboard. Its journal
+# hook writes every mutation back into the table and indexes.
+class FleetTable:
+    def __init__(self, n_homes, rng=None):
+        rng = np.random.default_rng() if rng is None else rng
+        template = HomeState()
+        self.size = n_homes
+        self.light_names = template.lights.names
+        self.camera_names = template.cameras.names
+        self.door_names = template.doors.names
+        self.version = 0
+
+        self.security = rng.choice(len(SECURITY_STATES), n_homes, p=[0.5, 0.3, 0.2]).astype(np.int8)
+        self.lights = rng.random((n_homes, len(self.light_names))) < 0.3
+        self.cameras = rng.random((n_homes, len(self.camera_names))) < 0.95
+        self.doors = rng.random((n_homes, len(self.door_names))) < 0.02
+        self.temperature = rng.normal(21.5, 1.5, n_homes).round(1).astype(np.float32)
+        self.humidity = rng.integers(30, 71, n_homes).astype(np.int8)
+        self.thermostat = rng.integers(18, 26, n_homes).astype(np.int8)
+        self.fan_speed = np.zeros(n_homes, np.int8)
+        # Homes that were armed with a door open start with the matching alerts
+        self.alert_count = ((self.security != 0)[:, None] & self.doors).sum(axis=1).astype(np.int32)
+
+        self._index = {
+            'armed': self.security != 0,
+            'door_open': self.doors.any(axis=1),
+            'camera_off': ~self.cameras.all(axis=1),
+            'alert_active': self.alert_count > 0,
+        }
+        self._homes = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def name(index):
+        return f"Home {index + 1:05d}"
+
+    @staticmethod
+    def index_of(name):
+        return int(name.rsplit(" ", 1)[1]) - 1
+
+    # Number of homes in each status
+    def counts(self):
+        with self._lock:
+            return {status: int(np.count_nonzero(column)) for status, column in self._index.items()}
+
+    # Row numbers of the homes in every one of `statuses`, a page at a time; returns
+    # (rows on this page, total matching)
+    def query(self, statuses=(), offset=0, limit=50):
+        with self._lock:
+            if not statuses:
+                total = self.size
+                return np.arange(offset, min(offset + limit, total)), total
+            mask = self._index[statuses[0]].copy()
+            for status in statuses[1:]:
+                mask &= self._index[status]
+            rows = np.flatnonzero(mask)
+            return rows[offset:offset + limit], len(rows)
+
+    # Display columns for `rows`
+    def rows(self, rows):
+        with self._lock:
+            return {
+                "Home": [self.name(row) for row in rows],
+                "Security": [SECURITY_STATES[code].replace('_', ' ').capitalize() for code in self.security[rows]],
+                "Doors open": self.doors[rows].sum(axis=1),
+                "Cameras off": (~self.cameras[rows]).sum(axis=1),
+                "Lights on": self.lights[rows].sum(axis=1),
+                "Alerts": self.alert_count[rows],
+                "Temperature (°C)": self.temperature[rows],
+                "Thermostat (°C)": self.thermostat[rows],
+            }
+
+    # The home in row `index` as a HomeState whose changes are written back here
+    def home(self, index):
+        with self._lock:
+            home = self._homes.get(index)
+            if home is None:
+                home = HomeState(self.name(index))
+                home.restore(self._snapshot(index, home))
+                home.journal = lambda op, args: self._apply(index, op, args)
+                self._homes[index] = home
+            return home
+
+    def _snapshot(self, index, home):
+        snapshot = home.to_snapshot()
+        security = SECURITY_STATES[self.security[index]]
+        snapshot['climate'].update(
+            temperature=float(self.temperature[index]), humidity=int(self.humidity[index]),
+            thermostat=int(self.thermostat[index]), fan_speed=int(self.fan_speed[index]),
+            last_update=datetime.now().strftime("%H:%M:%S"),
+        )
+        snapshot['lights'] = dict(zip(self.light_names, self.lights[index].tolist()))
+        snapshot['cameras'] = dict(zip(self.camera_names, self.cameras[index].tolist()))
+        snapshot['doors'] = {door: 'open' if is_open else 'closed'
+                             for door, is_open in zip(self.door_names, self.doors[index].tolist())}
+        snapshot['security_system'] = security
+        snapshot['alerts'] = [_DOOR_ALERT.format(door) for door, value in snapshot['doors'].items()
+                              if value == 'open' and security != 'disarmed']
+        return snapshot
+
+    # Journal hook of a materialized home: mirror one mutation into the columns and indexes
+    def _apply(self, index, op, args):
+        with self._lock:
+            if op == 'light':
+                self.lights[index, self.light_names.index(args[0])] = args[1]
+            elif op == 'camera':
+                self.cameras[index, self.camera_names.index(args[0])] = args[1]
+                self._index['camera_off'][index] = not self.cameras[index].all()
+            elif op == 'door':
+                self.doors[index, self.door_names.index(args[0])] = args[1] == 'open'
+                self._index['door_open'][index] = self.doors[index].any()
+            elif op == 'security':
+                self.security[index] = SECURITY_STATES.index(args[0])
+                self._index['armed'][index] = args[0] != 'disarmed'
+            elif op == 'thermostat':
+                self.thermostat[index] = args[0]
+            elif op == 'fan_speed':
+                self.fan_speed[index] = args[0]
+            elif op == 'sensors':
+                self.temperature[index] = args[0]
+                self.humidity[index] = args[1]
+            elif op == 'alert':
+                self.alert_count[index] += 1
+                self._index['alert_active'][index] = True
+            elif op == 'clear_alerts':
+                self.alert_count[index] = 0
+                self._index['alert_active'][index] = False
+            self.version += 1
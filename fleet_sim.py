@@ -0,0 +1,117 @@
+import argparse
+import time
+
+import numpy as np
+
+from alert_rules import DEFAULT_RULES, RuleEngine
+
+# Random-walk parameters. Humidity and motion match update_sensors() in app.py;
+# temperature deliberately stays a random walk rather than following the thermal
+# model there, so every sensor moves every step and the alert path is exercised.
+TEMPERATURE_STEP = 0.8
+HUMIDITY_STEP = 2
+HUMIDITY_MIN = 30
+HUMIDITY_MAX = 70
+MOTION_CHANCE = 0.1
+
+
+# Events produced by one simulator step. Motion and alert events are pairs of index
+# arrays (homes, sensors) so downstream consumers can stay vectorized; activities()
+# and alerts() expand them into the same messages the scalar path writes.
+class FleetEvents:
+    __slots__ = ('timestamp', 'motion_started', 'temperature_alerts', 'firings')
+
+    def __init__(self, timestamp, motion_started, temperature_alerts, firings):
+        self.timestamp = timestamp
+        self.motion_started = motion_started
+        self.temperature_alerts = temperature_alerts
+        self.firings = firings
+
+    def __len__(self):
+        return len(self.motion_started[0]) + len(self.temperature_alerts[0])
+
+    # (home, sensor, message, entry_type) tuples, as add_activity() would log them
+    def activities(self):
+        for home, sensor in zip(*(index.tolist() for index in self.motion_started)):
+            yield home, sensor, "Motion detected", "motion"
+        for home, sensor, message in self.alerts():
+            yield home, sensor, message, "alert"
+
+    # (home, sensor, message) tuples for newly raised alerts
+    def alerts(self):
+        homes, sensors = (index.tolist() for index in self.temperature_alerts)
+        for home, sensor, (rule, entity, message) in zip(homes, sensors, self.firings):
+            yield home, sensor, message
+
+
+# Advances n_homes x n_sensors simulated sensors per step with one set of NumPy
+# operations, using the same rounding, clamping and alert rules as the scalar path
+# (see the random-walk parameters above)
+class FleetSimulator:
+    def __init__(self, n_homes, n_sensors=1, rng=None, temperature=21.5, humidity=42, rules=DEFAULT_RULES):
+        self.shape = (n_homes, n_sensors)
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.temperature = np.full(self.shape, temperature, dtype=np.float64)
+        self.humidity = np.full(self.shape, humidity, dtype=np.float64)
+        self.motion = np.zeros(self.shape, dtype=bool)
+        # Temperature alerts are keyed by flat (home, sensor) index
+        self.rules = RuleEngine(rules)
+
+    @property
+    def n_homes(self):
+        return self.shape[0]
+
+    # Forget raised alerts so they can be raised again
+    def clear_alerts(self):
+        self.rules.reset()
+
+    def step(self, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        draws = self.rng.random((3,) + self.shape)
+
+        self.temperature += (draws[0] - 0.5) * TEMPERATURE_STEP
+        np.round(self.temperature, 1, out=self.temperature)
+
+        self.humidity += (draws[1] - 0.5) * HUMIDITY_STEP
+        np.round(self.humidity, 0, out=self.humidity)
+        np.clip(self.humidity, HUMIDITY_MIN, HUMIDITY_MAX, out=self.humidity)
+
+        motion = draws[2] < MOTION_CHANCE
+        motion_started = np.nonzero(motion & ~self.motion)
+        self.motion = motion
+
+        fired = self.rules.evaluate('temperature', self.temperature.reshape(-1), now=timestamp)
+        temperature_alerts = np.unravel_index(fired.entity_rows, self.shape)
+
+        return FleetEvents(timestamp, motion_started, temperature_alerts, fired)
+
+
+# Drive a simulated fleet at a fixed rate and report per-step cost
+def main():
+    parser = argparse.ArgumentParser(description="Run the vectorized fleet sensor simulator")
+    parser.add_argument("--homes", type=int, default=10000)
+    parser.add_argument("--sensors", type=int, default=1)
+    parser.add_argument("--hz", type=float, default=1.0)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    simulator = FleetSimulator(args.homes, args.sensors, np.random.default_rng(args.seed))
+    interval = 1.0 / args.hz
+    step_times = []
+    events = 0
+    deadline = time.perf_counter()
+    for _ in range(int(args.seconds * args.hz)):
+        started = time.perf_counter()
+        events += len(simulator.step())
+        step_times.append(time.perf_counter() - started)
+        deadline += interval
+        time.sleep(max(0.0, deadline - time.perf_counter()))
+
+    step_times = np.array(step_times) * 1000
+    print(f"{args.homes} homes x {args.sensors} sensors, {len(step_times)} steps, {events} events")
+    print(f"step ms: mean {step_times.mean():.3f}  p95 {np.percentile(step_times, 95):.3f}  max {step_times.max():.3f}")
+
+
+if __name__ == "__main__":
+    main()
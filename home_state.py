@@ -0,0 +1,327 @@
+import threading
+from array import array
+from datetime import datetime
+
+# Sections of the home state; each one has its own lock and version counter.
+# The activity log and energy rollups are kept separately (see activity_log.py
+# and energy.py).
+SECTIONS = ('climate', 'lights', 'cameras', 'doors', 'security', 'irrigation', 'alerts')
+
+
+# Fixed set of named devices whose state is one of a few values (on/off, open/closed),
+# stored as indexes into `states` in a compact byte array
+class SwitchBank:
+    __slots__ = ('names', 'states', '_index', '_values')
+
+    def __init__(self, initial, states=(False, True)):
+        self.names = tuple(initial)
+        self.states = tuple(states)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self._values = array('b', (self.states.index(value) for value in initial.values()))
+
+    def __getitem__(self, name):
+        return self.states[self._values[self._index[name]]]
+
+    def __setitem__(self, name, value):
+        self._values[self._index[name]] = self.states.index(value)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def items(self):
+        return [(name, self.states[value]) for name, value in zip(self.names, self._values)]
+
+    def to_dict(self):
+        return dict(self.items())
+
+
+# Sensor readings and climate controls
+class Climate:
+    __slots__ = ('temperature', 'humidity', 'motion', 'thermostat', 'fan_speed', 'last_update')
+
+    def __init__(self, temperature=21.5, humidity=42, motion=False, thermostat=22, fan_speed=0):
+        self.temperature = temperature
+        self.humidity = humidity
+        self.motion = motion
+        self.thermostat = thermostat
+        self.fan_speed = fan_speed
+        self.last_update = datetime.now().strftime("%H:%M:%S")
+
+
+# A single irrigation zone
+class IrrigationZone:
+    __slots__ = ('active', 'schedule', 'duration')
+
+    def __init__(self, active=False, schedule='06:00 AM', duration=15):
+        self.active = active
+        self.schedule = schedule
+        self.duration = duration
+
+    # Dict-style access so existing `data['active']` style reads keep working
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+# Process-wide home state shared by every session. Each section is guarded by its
+# own lock so unrelated mutations don't contend, and every mutation bumps both the
+# global version and the version of the section it touched.
+class HomeState:
+    __slots__ = ('name', 'climate', 'lights', 'cameras', 'doors', 'security_system', 'irrigation_zones',
+                 'alerts', 'version', 'journal', '_listeners', '_versions', '_locks', '_version_lock')
+
+    def __init__(self, name="My Home"):
+        self.name = name
+        self.climate = Climate()
+        self.lights = SwitchBank({'living': False, 'kitchen': True, 'bedroom': False})
+        self.cameras = SwitchBank({'front_door': True, 'backyard': False, 'garage': False})
+        self.doors = SwitchBank({'main': 'closed', 'garage': 'closed', 'back': 'closed'},
+                                states=('closed', 'open'))
+        self.security_system = 'disarmed'
+        self.irrigation_zones = {
+            'front_lawn': IrrigationZone(schedule='06:00 AM', duration=15),
+            'backyard': IrrigationZone(schedule='07:00 AM', duration=20),
+            'garden': IrrigationZone(schedule='05:30 AM', duration=10)
+        }
+        self.alerts = []
+        self.version = 0
+        # Called as journal(op, args) after every mutation, with the lock of the
+        # mutated section held; see persistence.py
+        self.journal = None
+        # Called as listener(home, version, section, op, args) after every mutation,
+        # including ones that aren't journaled; see change_feed.py
+        self._listeners = []
+        self._versions = dict.fromkeys(SECTIONS, 0)
+        self._locks = {section: threading.RLock() for section in SECTIONS}
+        self._version_lock = threading.Lock()
+
+    # Lock guarding a section, for callers that need a consistent multi-field read
+    def lock(self, section):
+        return self._locks[section]
+
+    # Current version of a section
+    def section_version(self, section):
+        return self._versions[section]
+
+    # Record a mutation of `section`; callers must hold the section lock
+    def _bump(self, section):
+        with self._version_lock:
+            self.version += 1
+            self._versions[section] = self.version
+            return self.version
+
+    # Add or remove a change listener
+    def subscribe(self, listener):
+        if listener not in self._listeners:
+            self._listeners = self._listeners + [listener]
+
+    def unsubscribe(self, listener):
+        self._listeners = [other for other in self._listeners if other != listener]
+
+    # Pass a mutation to the journal (unless it's transient) as an op that apply() can
+    # replay, and to the listeners
+    def _record(self, op, *args, durable=True):
+        if durable and self.journal is not None:
+            self.journal(op, args)
+        if self._listeners:
+            section = _OPS[op][0]
+            for listener in self._listeners:
+                listener(self, self._versions[section], section, op, args)
+
+    def toggle_light(self, room):
+        with self._locks['lights']:
+            self.lights[room] = not self.lights[room]
+            self._bump('lights')
+            self._record('light', room, self.lights[room])
+            return self.lights[room]
+
+    def toggle_camera(self, camera):
+        with self._locks['cameras']:
+            self.cameras[camera] = not self.cameras[camera]
+            self._bump('cameras')
+            self._record('camera', camera, self.cameras[camera])
+            return self.cameras[camera]
+
+    # Returns the previous door status
+    def set_door(self, door, status):
+        with self._locks['doors']:
+            old_status = self.doors[door]
+            self.doors[door] = status
+            self._bump('doors')
+            self._record('door', door, status)
+            return old_status
+
+    # Returns the previous security system status
+    def set_security_system(self, status):
+        with self._locks['security']:
+            old_status = self.security_system
+            self.security_system = status
+            self._bump('security')
+            self._record('security', status)
+            return old_status
+
+    # Returns the previous thermostat setpoint
+    def set_thermostat(self, value):
+        with self._locks['climate']:
+            old_value = self.climate.thermostat
+            self.climate.thermostat = value
+            self._bump('climate')
+            self._record('thermostat', value)
+            return old_value
+
+    # Returns the previous fan speed
+    def set_fan_speed(self, speed):
+        with self._locks['climate']:
+            old_speed = self.climate.fan_speed
+            self.climate.fan_speed = speed
+            self._bump('climate')
+            self._record('fan_speed', speed)
+            return old_speed
+
+    # Store a new set of sensor readings; returns whether motion was newly detected
+    def update_sensors(self, temperature, humidity, motion):
+        with self._locks['climate']:
+            motion_started = motion and not self.climate.motion
+            self.climate.temperature = temperature
+            self.climate.humidity = humidity
+            self.climate.motion = motion
+            self.climate.last_update = datetime.now().strftime("%H:%M:%S")
+            self._bump('climate')
+            self._record('sensors', temperature, humidity, motion, self.climate.last_update)
+            return motion_started
+
+    # Mark a zone as running or stopped; returns whether the state changed. Not
+    # journaled (only published): after a restart zones start idle and the scheduler
+    # runs them again.
+    def set_irrigation_active(self, zone, active):
+        with self._locks['irrigation']:
+            data = self.irrigation_zones[zone]
+            if data.active == active:
+                return False
+            data.active = active
+            self._bump('irrigation')
+            self._record('irrigation_active', zone, active, durable=False)
+            return True
+
+    def set_irrigation_schedule(self, zone, schedule, duration):
+        with self._locks['irrigation']:
+            data = self.irrigation_zones[zone]
+            data.schedule = schedule
+            data.duration = duration
+            self._bump('irrigation')
+            self._record('irrigation_schedule', zone, schedule, duration)
+
+    def add_alert(self, message):
+        with self._locks['alerts']:
+            self.alerts.append(message)
+            self._bump('alerts')
+            self._record('alert', message)
+
+    def clear_alerts(self):
+        with self._locks['alerts']:
+            self.alerts = []
+            self._bump('alerts')
+            self._record('clear_alerts')
+
+    # Plain-data copy of the persistent state; the caller holds every section lock
+    def to_snapshot(self):
+        climate = self.climate
+        return {
+            'climate': {name: getattr(climate, name) for name in Climate.__slots__},
+            'lights': self.lights.to_dict(),
+            'cameras': self.cameras.to_dict(),
+            'doors': self.doors.to_dict(),
+            'security_system': self.security_system,
+            'irrigation': {zone: (data.schedule, data.duration) for zone, data in self.irrigation_zones.items()},
+            'alerts': list(self.alerts),
+        }
+
+    # Load a to_snapshot() result. Devices or zones no longer defined are skipped.
+    def restore(self, snapshot):
+        for name, value in snapshot['climate'].items():
+            if name in Climate.__slots__:
+                setattr(self.climate, name, value)
+        for bank, values in ((self.lights, snapshot['lights']), (self.cameras, snapshot['cameras']),
+                             (self.doors, snapshot['doors'])):
+            for name, value in values.items():
+                if name in bank:
+                    bank[name] = value
+        self.security_system = snapshot['security_system']
+        for zone, (schedule, duration) in snapshot['irrigation'].items():
+            if zone in self.irrigation_zones:
+                self.irrigation_zones[zone].schedule = schedule
+                self.irrigation_zones[zone].duration = duration
+        self.alerts = list(snapshot['alerts'])
+        for section in SECTIONS:
+            self._bump(section)
+
+    # Re-apply an op passed to the journal, without journaling it again
+    def apply(self, op, args):
+        section, setter = _OPS[op]
+        with self._locks[section]:
+            setter(self, *args)
+            self._bump(section)
+
+
+# Replay of a SwitchBank op; names no longer defined are skipped
+def _set_switch(section):
+    def setter(state, name, value):
+        bank = getattr(state, section)
+        if name in bank:
+            bank[name] = value
+    return setter
+
+
+def _set_attribute(attribute, on_climate=False):
+    def setter(state, value):
+        setattr(state.climate if on_climate else state, attribute, value)
+    return setter
+
+
+def _set_sensors(state, temperature, humidity, motion, last_update):
+    state.climate.temperature = temperature
+    state.climate.humidity = humidity
+    state.climate.motion = motion
+    state.climate.last_update = last_update
+
+
+def _set_irrigation_schedule(state, zone, schedule, duration):
+    data = state.irrigation_zones.get(zone)
+    if data is not None:
+        data.schedule = schedule
+        data.duration = duration
+
+
+def _set_irrigation_active(state, zone, active):
+    data = state.irrigation_zones.get(zone)
+    if data is not None:
+        data.active = active
+
+
+def _add_alert(state, message):
+    state.alerts.append(message)
+
+
+def _clear_alerts(state):
+    state.alerts = []
+
+
+# Journal ops: the section each one touches and how to re-apply it
+_OPS = {
+    'light': ('lights', _set_switch('lights')),
+    'camera': ('cameras', _set_switch('cameras')),
+    'door': ('doors', _set_switch('doors')),
+    'security': ('security', _set_attribute('security_system')),
+    'thermostat': ('climate', _set_attribute('thermostat', on_climate=True)),
+    'fan_speed': ('climate', _set_attribute('fan_speed', on_climate=True)),
+    'sensors': ('climate', _set_sensors),
+    'irrigation_schedule': ('irrigation', _set_irrigation_schedule),
+    'irrigation_active': ('irrigation', _set_irrigation_active),
+    'alert': ('alerts', _add_alert),
+    'clear_alerts': ('alerts', _clear_alerts),
+}
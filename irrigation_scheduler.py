@@ -0,0 +1,222 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Seconds left between one zone stopping and the next queued zone on the same
+# property starting
+ZONE_GAP = 5.0
+
+
+# Parse a display schedule such as '06:00 AM'
+def parse_schedule(schedule):
+    return datetime.strptime(schedule, "%I:%M %p").time()
+
+
+# Timestamp of the next daily occurrence of `schedule` strictly after `now`
+def next_run(schedule, now):
+    moment = datetime.combine(datetime.fromtimestamp(now).date(), parse_schedule(schedule))
+    if moment.timestamp() <= now:
+        moment += timedelta(days=1)
+    return moment.timestamp()
+
+
+# One pending start or stop in the heap. Cancelling only flags the entry; it is
+# discarded when it reaches the top of the heap.
+class _Entry:
+    __slots__ = ('fire_at', 'seq', 'zone', 'kind', 'duration', 'cancelled')
+
+    def __init__(self, fire_at, seq, zone, kind, duration):
+        self.fire_at = fire_at
+        self.seq = seq
+        self.zone = zone
+        self.kind = kind
+        self.duration = duration
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.fire_at, self.seq) < (other.fire_at, other.seq)
+
+
+# Runs irrigation zones at their scheduled times from a background thread.
+#
+# Zones are keyed by (property, zone). Pending starts and stops live in a min-heap
+# ordered by fire time, so scheduling and cancelling are O(log n) and the thread
+# sleeps until the earliest entry is due instead of checking every zone per tick.
+# Only one zone per property runs at a time: a start that would overlap is queued
+# until the running zone's stop time, and brought forward if it stops early; stop_now()
+# also cancels a queued start. `on_start(zone, duration)` and `on_stop(zone)` are
+# called whenever a zone starts or stops, in order and without the scheduler's lock
+# held, so they may take other locks or call back into the scheduler.
+class IrrigationScheduler(threading.Thread):
+    def __init__(self, on_start, on_stop, clock=time.time):
+        super().__init__(name="irrigation-scheduler", daemon=True)
+        self.on_start = on_start
+        self.on_stop = on_stop
+        self.clock = clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._starts = {}
+        self._stops = {}
+        self._running = {}
+        # Queued starts per property: property -> {zone: entry}, in queue order
+        self._queued = {}
+        # Callbacks due, called by _dispatch() once the lock is released
+        self._events = []
+        self._dispatching = threading.RLock()
+        self._cancelled = 0
+        self._stopped = False
+        self._wakeup = threading.Condition(threading.RLock())
+
+    def __len__(self):
+        return len(self._heap) - self._cancelled
+
+    # Whether a start of `zone` is waiting for another zone to finish
+    def queued(self, zone):
+        return zone in self._queued.get(zone[0], ())
+
+    # (Re)schedule a zone's daily run at `schedule` (e.g. '06:00 AM') for `duration` minutes
+    def schedule(self, zone, schedule, duration):
+        with self._wakeup:
+            self._cancel(self._starts.pop(zone, None))
+            self._starts[zone] = self._push(next_run(schedule, self.clock()), zone, 'start', duration * 60)
+
+    # Start a zone now for `duration` minutes, waiting for any overlapping zone first.
+    # Returns False if the start was deferred.
+    def start_now(self, zone, duration):
+        with self._wakeup:
+            started = self._start_zone(zone, duration * 60, self.clock())
+        self._dispatch()
+        return started
+
+    # Stop a running zone now, or cancel its queued start
+    def stop_now(self, zone):
+        with self._wakeup:
+            self._unqueue(zone)
+            self._stop_zone(zone)
+        self._dispatch()
+
+    def shutdown(self):
+        with self._wakeup:
+            self._stopped = True
+            self._wakeup.notify()
+
+    def run(self):
+        while True:
+            with self._wakeup:
+                entry = self._next_due()
+                if entry is None:
+                    return
+                try:
+                    self._fire(entry)
+                except Exception:
+                    logger.exception("Irrigation event for %s failed", entry.zone)
+            self._dispatch()
+
+    # Wait for the next live entry to come due and pop it; None once shut down
+    def _next_due(self):
+        while not self._stopped:
+            if not self._heap:
+                self._wakeup.wait()
+                continue
+            entry = self._heap[0]
+            if entry.cancelled:
+                heapq.heappop(self._heap)
+                self._cancelled -= 1
+                continue
+            delay = entry.fire_at - self.clock()
+            if delay > 0:
+                self._wakeup.wait(delay)
+                continue
+            return heapq.heappop(self._heap)
+        return None
+
+    # Call the callbacks queued by _start_zone() and _stop_zone(). Taking the dispatch
+    # lock before the scheduler's keeps callbacks from different threads in order.
+    def _dispatch(self):
+        with self._dispatching:
+            with self._wakeup:
+                events, self._events = self._events, []
+            for callback, args in events:
+                try:
+                    callback(*args)
+                except Exception:
+                    logger.exception("Irrigation callback for %s failed", args[0])
+
+    def _push(self, fire_at, zone, kind, duration=0):
+        entry = _Entry(fire_at, next(self._seq), zone, kind, duration)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.notify()
+        return entry
+
+    def _cancel(self, entry):
+        if entry is not None and not entry.cancelled:
+            entry.cancelled = True
+            self._cancelled += 1
+            # Rebuild once most of the heap is dead entries so memory stays bounded
+            if self._cancelled > 64 and self._cancelled * 2 > len(self._heap):
+                self._heap = [e for e in self._heap if not e.cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _fire(self, entry):
+        if entry.kind == 'stop':
+            self._stops.pop(entry.zone, None)
+            self._stop_zone(entry.zone)
+            return
+        queued = self._queued.get(entry.zone[0])
+        if queued is not None and queued.get(entry.zone) is entry:
+            del queued[entry.zone]
+            if not queued:
+                del self._queued[entry.zone[0]]
+        elif self._starts.get(entry.zone) is entry:
+            # Daily run: queue tomorrow's before starting today's
+            self._starts[entry.zone] = self._push(entry.fire_at + 86400, entry.zone, 'start', entry.duration)
+        self._start_zone(entry.zone, entry.duration, entry.fire_at)
+
+    def _start_zone(self, zone, seconds, now):
+        property_id = zone[0]
+        running = self._running.get(property_id)
+        if running == zone:
+            return True
+        if running is not None:
+            # Retry once the running zone's stop has fired
+            self._unqueue(zone)
+            entry = self._push(self._stops[running].fire_at + ZONE_GAP, zone, 'start', seconds)
+            self._queued.setdefault(property_id, {})[zone] = entry
+            return False
+        self._unqueue(zone)
+        self._running[property_id] = zone
+        self._stops[zone] = self._push(max(now, self.clock()) + seconds, zone, 'stop')
+        self._events.append((self.on_start, (zone, seconds / 60)))
+        return True
+
+    def _stop_zone(self, zone):
+        property_id = zone[0]
+        if self._running.get(property_id) != zone:
+            return
+        del self._running[property_id]
+        self._cancel(self._stops.pop(zone, None))
+        self._events.append((self.on_stop, (zone,)))
+        # Bring the property's queued starts forward, keeping their order
+        queued = self._queued.get(property_id)
+        if queued:
+            fire_at = self.clock() + ZONE_GAP
+            for queued_zone, entry in list(queued.items()):
+                if entry.fire_at > fire_at:
+                    self._cancel(entry)
+                    queued[queued_zone] = self._push(fire_at, queued_zone, 'start', entry.duration)
+
+    # Cancel a queued start of `zone`, if any
+    def _unqueue(self, zone):
+        queued = self._queued.get(zone[0])
+        if queued is None or zone not in queued:
+            return
+        self._cancel(queued.pop(zone))
+        if not queued:
+            del self._queued[zone[0]]
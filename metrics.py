@@ -0,0 +1,164 @@
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+
+# Set SMART_HOME_METRICS=0 to turn instrumentation off. Timers then cost nothing:
+# decorators return the function unchanged and timer() a shared no-op context.
+ENABLED = os.environ.get("SMART_HOME_METRICS", "1") != "0"
+
+# Upper bounds, in seconds, of the duration histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+# Call durations for one instrumented code path
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    # Upper bound of the bucket holding the q-th quantile (the maximum for the overflow bucket)
+    def quantile(self, q):
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def copy(self):
+        other = Histogram()
+        other.counts = list(self.counts)
+        other.count = self.count
+        other.sum = self.sum
+        other.max = self.max
+        return other
+
+
+def _label(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Process-wide duration histograms and event counters, keyed by name
+class Registry:
+    def __init__(self):
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    # Consistent copies of (histograms, counters) for display or export
+    def snapshot(self):
+        with self._lock:
+            return ({name: histogram.copy() for name, histogram in self._histograms.items()},
+                    dict(self._counters))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # Everything in Prometheus text exposition format
+    def to_prometheus(self):
+        histograms, counters = self.snapshot()
+        lines = [
+            "# HELP smart_home_duration_seconds Time spent in instrumented code paths.",
+            "# TYPE smart_home_duration_seconds histogram",
+        ]
+        for name, histogram in sorted(histograms.items()):
+            label = _label(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append(f'smart_home_duration_seconds_bucket{{name="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'smart_home_duration_seconds_bucket{{name="{label}",le="+Inf"}} {histogram.count}')
+            lines.append(f'smart_home_duration_seconds_sum{{name="{label}"}} {histogram.sum:.6f}')
+            lines.append(f'smart_home_duration_seconds_count{{name="{label}"}} {histogram.count}')
+        lines.append("# HELP smart_home_events_total Events counted by the app.")
+        lines.append("# TYPE smart_home_events_total counter")
+        for name, value in sorted(counters.items()):
+            lines.append(f'smart_home_events_total{{name="{_label(name)}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    # Write the Prometheus text to `path`, replacing the old file atomically so a
+    # scraper never reads half a file
+    def write_prometheus(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(temp_path, path)
+
+
+registry = Registry()
+
+_NULL_TIMER = nullcontext()
+
+
+class _Timer:
+    __slots__ = ('name', 'started')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        registry.observe(self.name, time.perf_counter() - self.started)
+
+
+# Context manager recording how long its block takes under `name`
+def timer(name):
+    if not ENABLED:
+        return _NULL_TIMER
+    return _Timer(name)
+
+
+# Decorator recording every call's duration under `name` (the function name by default)
+def timed(name=None):
+    def decorate(func):
+        if not ENABLED:
+            return func
+        key = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                registry.observe(key, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+
+# Count an event under `name`
+def increment(name, amount=1):
+    if ENABLED:
+        registry.increment(name, amount)
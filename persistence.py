@@ -0,0 +1,190 @@
+import atexit
+import logging
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from home_state import SECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Seconds between snapshots
+SNAPSHOT_INTERVAL = 300.0
+
+SNAPSHOT_FILE = "snapshot.bin"
+_SNAPSHOT_MAGIC = b"SHSNAP01"
+# Snapshot header: magic and the sequence number of the last journal record it includes
+_SNAPSHOT_HEADER = struct.Struct("<8sQ")
+# Journal record header: body length and CRC32 of the body. The body is the
+# sequence number followed by the pickled (op, args).
+_RECORD_HEADER = struct.Struct("<II")
+_SEQ = struct.Struct("<Q")
+
+
+def _segment_name(first_seq):
+    return f"wal-{first_seq:016d}.log"
+
+
+# Journal records in `data` as (seq, op, args, end offset), stopping at the first
+# torn or corrupt record (the tail of a write cut short by a crash)
+def _read_records(data, path):
+    offset = 0
+    end = len(data)
+    while offset + _RECORD_HEADER.size <= end:
+        length, crc = _RECORD_HEADER.unpack_from(data, offset)
+        start = offset + _RECORD_HEADER.size
+        body = data[start:start + length]
+        if len(body) < length or zlib.crc32(body) != crc:
+            logger.warning("Ignoring damaged journal tail in %s at byte %d", path, offset)
+            return
+        seq, = _SEQ.unpack_from(body)
+        op, args = pickle.loads(body[_SEQ.size:])
+        offset = start + length
+        yield seq, op, args, offset
+
+
+# Durable storage for a HomeState. Every mutation is appended to a write-ahead log
+# as a small framed record; a snapshot of the whole state is written every so often,
+# after which the log segments it covers are deleted. On open, the snapshot is read
+# through mmap and only the log written since is replayed, so a restart costs one
+# small file read plus at most a snapshot interval's worth of records.
+#
+# Files in `directory`: snapshot.bin and wal-<first seq>.log segments. With
+# `sync` set each record is fsynced; otherwise records survive a process crash
+# but the last few may be lost on power failure.
+#
+# `extras` maps names to other accumulated state with to_snapshot()/restore() (e.g.
+# the energy rollups). It is not journaled, only saved with each snapshot, so a
+# crash loses at most a snapshot interval of it.
+class StateStore:
+    def __init__(self, directory, state, sync=False, extras=None):
+        self.directory = directory
+        self.state = state
+        self.sync = sync
+        self.extras = dict(extras or {})
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._wal = None
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    # Restore the state from disk and start journaling its mutations
+    def open(self):
+        started = time.perf_counter()
+        self.snapshot_seq = self.seq = self._load_snapshot()
+        replayed = self._replay()
+        logger.info("Restored home state to record %d (%d replayed) in %.1f ms",
+                    self.seq, replayed, (time.perf_counter() - started) * 1000)
+        self._open_segment()
+        self.state.journal = self.append
+        atexit.register(self.close)
+        return self
+
+    # Journal callback for HomeState; runs with the mutated section's lock held
+    def append(self, op, args):
+        body = pickle.dumps((op, args), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._wal is None:
+                return
+            self.seq += 1
+            body = _SEQ.pack(self.seq) + body
+            self._wal.write(_RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body)
+            if self.sync:
+                os.fsync(self._wal.fileno())
+
+    # Write a snapshot if anything changed since the last one, then drop the log
+    # segments it covers
+    def snapshot(self):
+        # Holding every section lock (in SECTIONS order, as mutators take at most
+        # one) gives a consistent state that matches the journal position exactly
+        locks = [self.state.lock(section) for section in SECTIONS]
+        for lock in locks:
+            lock.acquire()
+        try:
+            with self._lock:
+                if self._wal is None or self.seq == self.snapshot_seq:
+                    return
+                seq = self.seq
+                data = self.state.to_snapshot()
+                data['extras'] = {name: extra.to_snapshot() for name, extra in self.extras.items()}
+                self._wal.close()
+                self._open_segment()
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(_SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, seq))
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+        self.snapshot_seq = seq
+        for first_seq, segment in self._segments():
+            if first_seq <= seq:
+                os.remove(segment)
+
+    def close(self):
+        if self._wal is None:
+            return
+        self.snapshot()
+        with self._lock:
+            self.state.journal = None
+            self._wal.close()
+            self._wal = None
+
+    def _segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith("wal-") and name.endswith(".log"):
+                segments.append((int(name[4:-4]), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def _open_segment(self):
+        path = os.path.join(self.directory, _segment_name(self.seq + 1))
+        self._wal = open(path, "ab", buffering=0)
+
+    # Load snapshot.bin into the state; returns the record it was taken at
+    def _load_snapshot(self):
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return 0
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                magic, seq = _SNAPSHOT_HEADER.unpack_from(view)
+                if magic != _SNAPSHOT_MAGIC:
+                    raise ValueError(f"{path} is not a home state snapshot")
+                with view[_SNAPSHOT_HEADER.size:] as payload:
+                    data = pickle.loads(payload)
+        self.state.restore(data)
+        for name, extra in data.get('extras', {}).items():
+            if name in self.extras:
+                self.extras[name].restore(extra)
+        return seq
+
+    # Apply journal records newer than the snapshot; returns how many were applied.
+    # A damaged tail is cut off, so records appended after this open are not hidden
+    # behind it on the next one.
+    def _replay(self):
+        replayed = 0
+        for _, path in self._segments():
+            size = os.path.getsize(path)
+            if size == 0:
+                continue
+            good = 0
+            with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for seq, op, args, good in _read_records(mapped, path):
+                    if seq <= self.seq:
+                        continue
+                    self.state.apply(op, args)
+                    self.seq = seq
+                    replayed += 1
+            if good < size:
+                os.truncate(path, good)
+        return replayed
@@ -0,0 +1,99 @@
+import threading
+from collections import OrderedDict
+from html import escape
+
+# Number of rendered fragments kept in memory
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+# Return the fragment cached under `key` if it was built for `version`, otherwise
+# build it. Fragments are shared by every session, so each version of a card is
+# rendered once no matter how many dashboards show it.
+def memoized(key, version, build):
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and hit[0] == version:
+            _cache.move_to_end(key)
+            return hit[1]
+    html = build()
+    with _cache_lock:
+        _cache[key] = (version, html)
+        _cache.move_to_end(key)
+        if len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return html
+
+
+# Horizontal bar standing in for st.progress inside a fragment
+def progress_bar(fraction):
+    percent = min(max(fraction, 0.0), 1.0) * 100
+    return f"<div class='progress-track'><div class='progress-fill' style='width: {percent:.0f}%;'></div></div>"
+
+
+def _door_rows(doors):
+    rows = []
+    for door, status in doors.items():
+        door_color = "red" if status == "open" else "green"
+        rows.append(f"<div class='device-label'>🚪 {door.capitalize()} Door <span class='sensor-value' style='color: {door_color};'>{status.capitalize()}</span></div>")
+    return "".join(rows)
+
+
+# Sensor Data card: temperature, humidity, motion and door statuses
+def sensor_card(home):
+    def build():
+        climate = home.climate
+        temp_color = "red" if climate.temperature > 25 else "black"
+        motion_status = "Detected" if climate.motion else "None"
+        motion_color = "green" if climate.motion else "gray"
+        return (
+            "<div class='card'><h3>📊 Sensor Data</h3>"
+            f"<div class='device-label'>🌡️ Temperature <span class='sensor-value' style='color: {temp_color};'>{climate.temperature}°C</span></div>"
+            f"{progress_bar((climate.temperature - 15) / 20)}"
+            f"<div class='device-label'>💧 Humidity <span class='sensor-value'>{climate.humidity}%</span></div>"
+            f"{progress_bar(climate.humidity / 100)}"
+            f"<div class='device-label'>📡 Motion <span class='sensor-value' style='color: {motion_color};'>{motion_status}</span></div>"
+            f"{_door_rows(home.doors)}"
+            "</div>"
+        )
+    version = (home.section_version('climate'), home.section_version('doors'))
+    return memoized(('sensor', id(home)), version, build)
+
+
+# All active alerts as one block
+def alerts_card(home):
+    def build():
+        return "".join(f"<div class='alert'><strong>⚠️ Alert:</strong> {alert}</div>" for alert in home.alerts)
+    return memoized(('alerts', id(home)), home.section_version('alerts'), build)
+
+
+# IoT device list; `version` identifies the snapshot (and page) of `devices` being shown
+def iot_devices_card(devices, version):
+    def build():
+        rows = []
+        for device in devices:
+            status_color = "green" if device["status"] == "Connected" else "red"
+            # Everything but the color comes from the devices themselves
+            rows.append(
+                "<div class='wifi-network'><div>"
+                f"<b>{escape(str(device['icon']))} {escape(str(device['name']))}</b>"
+                f"<span style='color: {status_color}; margin-left: 10px;'>{escape(str(device['status']))}</span>"
+                f"<p style='color: gray; margin: 5px 0;'>{escape(str(device['details']))}</p>"
+                "</div></div>"
+            )
+        return "".join(rows)
+    return memoized(('iot',), version, build)
+
+
+# Weather forecast laid out as a row of days
+def weather_card(days, version):
+    def build():
+        cells = "".join(
+            f"<div style='text-align: center; flex: 1;'><h4>{day['day']}</h4><p style='font-size: 2rem; margin: 0;'>{day['icon']}</p>"
+            f"<p>{day['temp']}</p><p>Precipitation: {day['precip']}</p></div>"
+            for day in days
+        )
+        return f"<div style='display: flex;'>{cells}</div>"
+    return memoized(('weather',), version, build)
@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+
+# Default number of samples kept per channel: two days of 1 Hz data
+DEFAULT_CAPACITY = 2 * 24 * 3600
+
+
+# Fixed-capacity ring buffer of (timestamp, value) samples held in two preallocated
+# NumPy arrays. Samples must be appended in time order.
+class RingBuffer:
+    __slots__ = ('capacity', '_times', '_values', '_head', '_size', '_lock')
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, dtype=np.float64):
+        self.capacity = capacity
+        self._times = np.empty(capacity, dtype=np.float64)
+        self._values = np.empty(capacity, dtype=dtype)
+        self._head = 0
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp, value):
+        with self._lock:
+            head = self._head
+            self._times[head] = timestamp
+            self._values[head] = value
+            self._head = (head + 1) % self.capacity
+            if self._size < self.capacity:
+                self._size += 1
+
+    # Most recent sample as (timestamp, value), or None if the buffer is empty
+    def last(self):
+        with self._lock:
+            if not self._size:
+                return None
+            i = self._head - 1
+            return float(self._times[i]), self._values[i].item()
+
+    # Copy of the samples between `start` and `end` (inclusive), oldest first
+    def window(self, start=None, end=None):
+        with self._lock:
+            if self._size < self.capacity:
+                times = self._times[:self._size].copy()
+                values = self._values[:self._size].copy()
+            else:
+                head = self._head
+                times = np.concatenate((self._times[head:], self._times[:head]))
+                values = np.concatenate((self._values[head:], self._values[:head]))
+        lo = 0 if start is None else np.searchsorted(times, start, side='left')
+        hi = len(times) if end is None else np.searchsorted(times, end, side='right')
+        return times[lo:hi], values[lo:hi]
+
+    # Reduce the samples in [start, end] to at most `width` equal-time buckets.
+    # Returns (bucket_times, mins, maxs, means); empty buckets are omitted.
+    def downsample(self, width, start=None, end=None):
+        times, values = self.window(start, end)
+        if len(times) <= width:
+            values = values.astype(np.float64)
+            return times, values, values, values
+
+        t0, t1 = times[0], times[-1]
+        span = max(t1 - t0, 1e-9)
+        buckets = np.minimum(((times - t0) * (width / span)).astype(np.int64), width - 1)
+
+        # Buckets are non-decreasing, so each one is a contiguous run of samples
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+        counts = np.diff(np.append(starts, len(values)))
+        mins = np.minimum.reduceat(values, starts).astype(np.float64)
+        maxs = np.maximum.reduceat(values, starts).astype(np.float64)
+        means = np.add.reduceat(values, starts, dtype=np.float64) / counts
+        bucket_times = t0 + (buckets[starts] + 0.5) * (span / width)
+        return bucket_times, mins, maxs, means
+
+
+# One ring buffer per sensor channel
+class SensorHistory:
+    CHANNELS = ('temperature', 'humidity', 'motion')
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, channels=CHANNELS):
+        self.channels = {name: RingBuffer(capacity) for name in channels}
+
+    def __getitem__(self, channel):
+        return self.channels[channel]
+
+    # Append one sample per channel, all taken at `timestamp`
+    def record(self, timestamp, **values):
+        for channel, value in values.items():
+            self.channels[channel].append(timestamp, value)
@@ -0,0 +1,17 @@
+from anomaly import AnomalyDetector, Channel
+
+
+def spike(entities):
+    detector = AnomalyDetector([Channel('temperature', "{value} vs {expected}", warmup=5)])
+    for now in range(10):
+        detector.update('temperature', [20.0, 20.0], entities, now=now)
+    return detector.update('temperature', [20.0, 30.0], entities, now=10)
+
+
+def test_expected_is_mean_before_the_sample():
+    # Integer entities index the state arrays with a slice, named ones with an index array
+    for entities in (None, ['kitchen', 'garage']):
+        anomalies = spike(entities)
+        assert len(anomalies) == 1
+        assert anomalies.expected.tolist() == [20.0]
+        assert list(anomalies) == [(1 if entities is None else 'garage', "30.0 vs 20.0")]
@@ -0,0 +1,49 @@
+import threading
+import time
+
+from command_queue import CommandQueue
+
+
+def start_queue(window, max_delay):
+    queue = CommandQueue(window=window, max_delay=max_delay)
+    queue.start()
+    return queue
+
+
+def test_burst_is_applied_once_with_last_value():
+    queue = start_queue(window=0.05, max_delay=0.5)
+    applied = []
+    done = threading.Event()
+
+    def apply(value):
+        applied.append((value, time.monotonic()))
+        done.set()
+
+    started = time.monotonic()
+    for value in range(10):
+        queue.submit("thermostat", value, apply)
+    assert queue.pending("thermostat") == 9
+    assert done.wait(2.0)
+    time.sleep(0.1)
+    queue.shutdown()
+
+    assert [value for value, _ in applied] == [9]
+    assert applied[0][1] - started <= queue.max_delay
+    assert queue.pending("thermostat") is None
+
+
+def test_steady_commands_are_applied_by_max_delay():
+    queue = start_queue(window=0.1, max_delay=0.3)
+    applied = []
+    submitted = []
+    started = time.monotonic()
+    # Commands keep arriving faster than the window, so only max_delay releases them
+    while not applied and time.monotonic() - started < 2.0:
+        submitted.append(len(submitted))
+        queue.submit("fan_speed", submitted[-1], lambda value: applied.append((value, time.monotonic())))
+        time.sleep(0.02)
+    queue.shutdown()
+
+    value, at = applied[0]
+    assert at - started <= queue.max_delay + 0.15
+    assert value in submitted and value > 0
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+import irrigation_scheduler
+from irrigation_scheduler import IrrigationScheduler
+
+
+# A started scheduler whose callbacks record (event, zone, time, lock held);
+# wait_for(count) returns the events once there are at least `count`
+@pytest.fixture
+def scheduler(monkeypatch):
+    monkeypatch.setattr(irrigation_scheduler, "ZONE_GAP", 0.05)
+    events = []
+    changed = threading.Condition()
+
+    def record(kind, zone, *args):
+        with changed:
+            events.append((kind, zone, time.time(), scheduler._wakeup._is_owned()))
+            changed.notify_all()
+
+    def wait_for(count, timeout=5.0):
+        with changed:
+            assert changed.wait_for(lambda: len(events) >= count, timeout)
+        return list(events)
+
+    scheduler = IrrigationScheduler(lambda *args: record('start', *args), lambda *args: record('stop', *args))
+    scheduler.wait_for = wait_for
+    scheduler.start()
+    yield scheduler
+    scheduler.shutdown()
+    scheduler.join()
+
+
+def test_overlapping_start_waits_for_running_zone(scheduler):
+    lawn, beds = ('home', 'lawn'), ('home', 'beds')
+    assert scheduler.start_now(lawn, 0.2 / 60)
+    assert not scheduler.start_now(beds, 0.2 / 60)
+    assert scheduler.queued(beds)
+
+    events = scheduler.wait_for(4)
+    assert [(kind, zone) for kind, zone, _, _ in events] == [
+        ('start', lawn), ('stop', lawn), ('start', beds), ('stop', beds)]
+    assert events[2][2] - events[1][2] >= irrigation_scheduler.ZONE_GAP * 0.9
+    assert not scheduler.queued(beds)
+
+
+def test_early_stop_brings_queued_start_forward(scheduler):
+    lawn, beds = ('home', 'lawn'), ('home', 'beds')
+    scheduler.start_now(lawn, 60)
+    scheduler.start_now(beds, 0.1 / 60)
+    stopped = time.time()
+    scheduler.stop_now(lawn)
+
+    events = scheduler.wait_for(3)
+    assert [(kind, zone) for kind, zone, _, _ in events[:3]] == [('start', lawn), ('stop', lawn), ('start', beds)]
+    assert events[2][2] - stopped < 2.0
+
+
+def test_stop_cancels_queued_start(scheduler):
+    lawn, beds = ('home', 'lawn'), ('home', 'beds')
+    scheduler.start_now(lawn, 0.2 / 60)
+    scheduler.start_now(beds, 0.1 / 60)
+    scheduler.stop_now(beds)
+    assert not scheduler.queued(beds)
+
+    scheduler.wait_for(2)
+    time.sleep(irrigation_scheduler.ZONE_GAP * 4)
+    assert [(kind, zone) for kind, zone, _, _ in scheduler.wait_for(2)] == [('start', lawn), ('stop', lawn)]
+
+
+def test_callbacks_run_without_the_lock(scheduler):
+    lawn = ('home', 'lawn')
+    scheduler.start_now(lawn, 0.05 / 60)
+    # The start is called from the caller's thread, the stop from the scheduler's
+    assert [held for _, _, _, held in scheduler.wait_for(2)] == [False, False]
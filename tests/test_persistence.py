@@ -0,0 +1,47 @@
+import os
+
+from energy import EnergyRollup
+from home_state import HomeState
+from persistence import StateStore, _segment_name
+
+
+def reopen(directory, **kwargs):
+    home = HomeState()
+    store = StateStore(directory, home, **kwargs).open()
+    return home, store
+
+
+def test_replay_survives_torn_first_record(tmp_path):
+    directory = str(tmp_path)
+    home, store = reopen(directory)
+    home.set_thermostat(25)
+    store.close()
+
+    # A crash while writing the first record of the next segment
+    with open(os.path.join(directory, _segment_name(store.seq + 1)), "wb") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    home, store = reopen(directory)
+    assert home.climate.thermostat == 25
+    home.set_thermostat(27)
+    home.set_security_system("armed_away")
+    store._wal.close()
+    store._wal = None
+
+    home, store = reopen(directory)
+    assert home.climate.thermostat == 27
+    assert home.security_system == "armed_away"
+
+
+def test_snapshot_keeps_energy_rollups(tmp_path):
+    directory = str(tmp_path)
+    rollup = EnergyRollup()
+    home, store = reopen(directory, extras={'energy': rollup})
+    rollup.ingest('fan', 1_700_000_000, 1.5)
+    home.set_thermostat(23)
+    store.close()
+
+    restored = EnergyRollup()
+    reopen(directory, extras={'energy': restored})
+    assert restored.current('day') == 1.5
+    assert restored.devices('month') == {'fan': 1.5}
@@ -0,0 +1,211 @@
+import argparse
+import threading
+import time
+
+import numpy as np
+
+from energy import FAN_KW_PER_LEVEL, HEATING_MAX_KW, LIGHT_KW
+
+# Rooms of the home as name -> (floor area in m², heat loss through the outside walls
+# and windows in W/K). The names match the light switches.
+DEFAULT_ROOMS = {
+    'living': (35.0, 30.0),
+    'kitchen': (15.0, 15.0),
+    'bedroom': (20.0, 20.0),
+}
+# Effective heat capacity of a room per m² of floor (air, walls, furnishings), J/K
+CAPACITY_PER_M2 = 60e3
+# Heat exchanged between a room and the rest of the home, W/K: with the fan off, and
+# added per fan level
+MIXING = 15.0
+MIXING_PER_LEVEL = 40.0
+# Heat from people and appliances in each room, W
+INTERNAL_GAIN = 80.0
+
+# Heating: PI control of the home's mean temperature on the thermostat setpoint, in kW
+# per °C of error and kW per °C·hour of accumulated error
+HEATING_GAIN = 1.5
+HEATING_INTEGRAL_GAIN = 0.5
+# Cooling starts COOLING_BAND above the setpoint (and not below COOLING_MIN), at
+# COOLING_GAIN kW per °C beyond that, and moves COOLING_COP kW of heat per kW drawn
+COOLING_BAND = 1.5
+COOLING_MIN = 24.0
+COOLING_GAIN = 1.0
+COOLING_MAX_KW = 1.5
+COOLING_COP = 3.0
+
+# Outdoor temperature: daily mean and swing in °C, and the hour of the daily low
+OUTDOOR_MEAN = 8.0
+OUTDOOR_SWING = 5.0
+OUTDOOR_LOW_HOUR = 5
+
+# Longest time advance() integrates in one step, in seconds
+MAX_STEP = 600.0
+# Step used by fast_forward(), in seconds
+FAST_FORWARD_STEP = 300.0
+
+
+# Hour of the day (0-24, local time) of epoch timestamps
+def local_hour(timestamps):
+    offset = time.localtime(float(np.min(timestamps))).tm_gmtoff
+    return (np.asarray(timestamps) + offset) % 86400 / 3600
+
+
+# Outdoor temperature at the given epoch timestamps: a daily sine around OUTDOOR_MEAN
+def outdoor_temperature(timestamps):
+    phase = (local_hour(timestamps) - OUTDOOR_LOW_HOUR) / 24 * 2 * np.pi
+    return OUTDOOR_MEAN - OUTDOOR_SWING * np.cos(phase)
+
+
+# Lumped RC thermal model of one or more homes, with every room of every home held in
+# (homes, rooms) NumPy arrays. Each room exchanges heat with the outdoors through its
+# walls and with the home's mean temperature through open doors and the fan, and
+# gains heat from people, lights and the HVAC (spread over rooms by floor area).
+# Over a step the inputs are held constant and each room relaxes exactly toward its
+# equilibrium temperature, so steps of any length stay stable.
+#
+# The HVAC follows the thermostat: a PI controller heats up to HEATING_MAX_KW, and a
+# proportional controller cools once the home is COOLING_BAND above the setpoint.
+# Setpoints, fan speeds and lights may differ per home, so a single fast_forward()
+# compares several policies side by side.
+class ThermalModel:
+    def __init__(self, rooms=DEFAULT_ROOMS, homes=1, temperature=21.5, now=None):
+        area, loss = np.array(list(rooms.values())).T
+        self.rooms = tuple(rooms)
+        self.share = area / area.sum()
+        self.capacity = area * CAPACITY_PER_M2
+        self.loss = loss
+        self.temperature = np.full((homes, len(self.rooms)), float(temperature))
+        self.integral = np.zeros(homes)
+        self.heating_kw = np.zeros(homes)
+        self.cooling_kw = np.zeros(homes)
+        self.time = time.time() if now is None else now
+        self._lock = threading.Lock()
+
+    @property
+    def homes(self):
+        return len(self.temperature)
+
+    # Floor-area weighted mean temperature of each home
+    def mean_temperature(self):
+        return self.temperature @ self.share
+
+    # Independent copy, optionally with home 0 repeated to `homes` homes
+    def copy(self, homes=None):
+        with self._lock:
+            other = object.__new__(ThermalModel)
+            other.rooms, other.share, other.capacity, other.loss = self.rooms, self.share, self.capacity, self.loss
+            rows = slice(None) if homes is None else np.zeros(homes, dtype=np.intp)
+            other.temperature = self.temperature[rows].copy()
+            other.integral = self.integral[rows].copy()
+            other.heating_kw = self.heating_kw[rows].copy()
+            other.cooling_kw = self.cooling_kw[rows].copy()
+            other.time = self.time
+            other._lock = threading.Lock()
+            return other
+
+    # Advance to `now` with the given thermostat setpoint, fan level and lights (on/off
+    # per room); returns the HVAC draw in kW over the step
+    def advance(self, now, setpoint, fan_speed=0, lights=0):
+        with self._lock:
+            dt = min(max(now - self.time, 0.0), MAX_STEP)
+            self.time = now
+            if dt:
+                coefficients = self._coefficients(dt, fan_speed, lights)
+                self._step(dt, outdoor_temperature(now), np.asarray(setpoint, dtype=np.float64), coefficients)
+            return self.heating_kw + self.cooling_kw
+
+    # Per-step constants for a step of `dt` seconds with the given fan level and lights:
+    # each room's equilibrium temperature is outdoor * w_outdoor + mean * w_mean +
+    # base + HVAC heat * w_hvac, and its distance to it shrinks by `decay`
+    def _coefficients(self, dt, fan_speed, lights):
+        mixing = (MIXING + MIXING_PER_LEVEL * np.asarray(fan_speed, dtype=np.float64))[..., None]
+        conductance = self.loss + mixing
+        decay = np.exp(-dt * conductance / self.capacity)
+        gains = INTERNAL_GAIN + np.asarray(lights, dtype=np.float64) * LIGHT_KW * 1000
+        return decay, self.loss / conductance, mixing / conductance, gains / conductance, 1000 * self.share / conductance
+
+    def _step(self, dt, outdoor, setpoint, coefficients):
+        decay, w_outdoor, w_mean, base, w_hvac = coefficients
+        mean = self.temperature @ self.share
+
+        # Heating: PI, integrating only while not saturated so it doesn't wind up
+        error = setpoint - mean
+        heating = HEATING_GAIN * error + HEATING_INTEGRAL_GAIN * self.integral
+        unsaturated = (heating < HEATING_MAX_KW) | (error < 0)
+        self.integral = np.maximum(self.integral + unsaturated * error * (dt / 3600), 0)
+        self.heating_kw = np.clip(heating, 0, HEATING_MAX_KW)
+        # Cooling: proportional, above the higher of the setpoint plus COOLING_BAND and
+        # COOLING_MIN, so a lowered setpoint coasts down instead of running the AC
+        excess = mean - np.maximum(setpoint + COOLING_BAND, COOLING_MIN)
+        self.cooling_kw = np.clip(excess * COOLING_GAIN, 0, COOLING_MAX_KW)
+
+        hvac = self.heating_kw - COOLING_COP * self.cooling_kw
+        equilibrium = outdoor * w_outdoor + mean[:, None] * w_mean + base + hvac[:, None] * w_hvac
+        self.temperature = equilibrium + (self.temperature - equilibrium) * decay
+
+    # Simulate `seconds` from now without touching the model, in steps of `step`
+    # seconds. `setpoint` is a constant, one value per home, or a (24, homes) array of
+    # setpoints by hour of day. Returns per-`interval` arrays of shape (intervals,
+    # homes): HVAC and fan energy in kWh, and the mean temperature at each interval's end.
+    def fast_forward(self, seconds, setpoint, fan_speed=0, lights=0, interval=3600.0, step=FAST_FORWARD_STEP):
+        model = self.copy()
+        steps_per_interval = int(round(interval / step))
+        intervals = int(seconds // interval)
+        times = model.time + step * np.arange(1, intervals * steps_per_interval + 1)
+        outdoor = outdoor_temperature(times).tolist()
+        setpoint = np.asarray(setpoint, dtype=np.float64)
+        if setpoint.ndim == 2:
+            setpoints = setpoint[local_hour(times).astype(np.intp)]
+        else:
+            setpoints = np.broadcast_to(setpoint, (len(times),) + setpoint.shape)
+        coefficients = model._coefficients(step, fan_speed, lights)
+
+        hvac_kw = np.zeros((len(times), model.homes))
+        mean = np.zeros((intervals, model.homes))
+        for i in range(len(times)):
+            model._step(step, outdoor[i], setpoints[i], coefficients)
+            hvac_kw[i] = model.heating_kw
+            hvac_kw[i] += model.cooling_kw
+            if (i + 1) % steps_per_interval == 0:
+                mean[i // steps_per_interval] = model.temperature @ model.share
+        hvac_kwh = hvac_kw.reshape(intervals, steps_per_interval, model.homes).sum(axis=1) * step / 3600
+        fan_kwh = np.broadcast_to(np.asarray(fan_speed) * FAN_KW_PER_LEVEL * interval / 3600,
+                                  (intervals, model.homes))
+        return {'hvac': hvac_kwh, 'fan': fan_kwh, 'temperature': mean}
+
+
+# Setpoint schedules compared by main(), as (24,) setpoints by hour of day
+POLICIES = {
+    "Constant 22°C": np.full(24, 22.0),
+    "Constant 21°C": np.full(24, 21.0),
+    "Night setback 18°C": np.where((np.arange(24) >= 23) | (np.arange(24) < 6), 18.0, 22.0),
+    "Night + workday setback": np.where((np.arange(24) >= 23) | (np.arange(24) < 6)
+                                        | ((np.arange(24) >= 9) & (np.arange(24) < 17)), 18.0, 22.0),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare thermostat schedules over a simulated period")
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--step", type=float, default=FAST_FORWARD_STEP)
+    args = parser.parse_args()
+
+    model = ThermalModel(homes=len(POLICIES))
+    schedule = np.stack(list(POLICIES.values()), axis=1)
+    started = time.perf_counter()
+    result = model.fast_forward(args.days * 86400, schedule, interval=3600.0, step=args.step)
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.days:g} days, {len(POLICIES)} schedules, {args.step:g} s steps: {elapsed * 1000:.0f} ms")
+    temperatures = result['temperature']
+    hours = local_hour(model.time + 3600 * np.arange(1, len(temperatures) + 1)).astype(np.intp)
+    for i, name in enumerate(POLICIES):
+        # Degree-hours below the constant 22°C schedule while someone is home and awake
+        shortfall = np.maximum(22.0 - temperatures[:, i], 0)[(hours >= 17) & (hours < 23)].sum()
+        print(f"{name:<26} {result['hvac'][:, i].sum():8.1f} kWh  mean {temperatures[:, i].mean():5.1f}°C  "
+              f"evening shortfall {shortfall:6.1f} °C·h")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# Daemon thread that calls `target` every `interval` seconds until stopped. Errors are
+# logged and the loop carries on, so one bad tick doesn't stop the worker.
+class PeriodicWorker(threading.Thread):
+    def __init__(self, name, interval, target):
+        super().__init__(name=name, daemon=True)
+        self.interval = interval
+        self.target = target
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.target()
+            except Exception:
+                logger.exception("%s tick failed", self.name)
+
+    def stop(self):
+        self._stopped.set()